@@ -8,7 +8,9 @@ CREATE TABLE IF NOT EXISTS groups (
     chat_title  TEXT,
     created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
     updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
-    deleted_at   TIMESTAMPTZ
+    deleted_at   TIMESTAMPTZ,
+    -- Gộp thông báo Facebook thành ít message nhất có thể (NULL = theo FB_COALESCE)
+    fb_coalesce  BOOLEAN
 );
 
 -- 2. Bảng shops: lưu thông tin shop_name và shop_id
@@ -83,3 +85,90 @@ CREATE TABLE IF NOT EXISTS fb_posts (
 CREATE INDEX IF NOT EXISTS idx_fb_posts_page    ON fb_posts(page_id);
 CREATE INDEX IF NOT EXISTS idx_fb_posts_created ON fb_posts(created_at DESC);
 
+-- 14. Bảng fb_page_schedule: lịch poll riêng của từng page, interval tính từ
+--     tần suất đăng bài trong fb_posts và ngân sách credits/ngày
+CREATE TABLE IF NOT EXISTS fb_page_schedule (
+    page_id           TEXT        PRIMARY KEY,
+    interval_seconds  INTEGER     NOT NULL,
+    next_poll_at      TIMESTAMPTZ NOT NULL,
+    last_polled_at    TIMESTAMPTZ,
+    created_at        TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 15. Bảng fb_page_cursors: bài mới nhất đã thấy của mỗi page, poll sau chỉ lấy
+--     bài mới hơn (limit tăng dần 3 → 10 → 20 khi mọi bài trả về đều mới)
+CREATE TABLE IF NOT EXISTS fb_page_cursors (
+    page_id     TEXT        PRIMARY KEY,
+    post_id     TEXT        NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+
+-- ── ETSY LISTINGS ────────────────────────────────────────────────────────────
+
+-- 10. Bảng listings: một bảng duy nhất cho mọi shop, partition theo hash shop_id
+CREATE TABLE IF NOT EXISTS listings (
+    shop_id         BIGINT      NOT NULL,
+    listing_id      TEXT        NOT NULL,
+    url             TEXT,
+    listing_images  TEXT,
+    created_at      TIMESTAMPTZ,
+    first_seen_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (shop_id, listing_id)
+) PARTITION BY HASH (shop_id);
+
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS listings_p%s PARTITION OF listings '
+            'FOR VALUES WITH (MODULUS 16, REMAINDER %s);', i, i);
+    END LOOP;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_listings_shop_created ON listings(shop_id, created_at DESC);
+
+-- 11. Bảng shop_watermarks: listing mới nhất đã thấy của mỗi shop
+CREATE TABLE IF NOT EXISTS shop_watermarks (
+    shop_id          BIGINT      PRIMARY KEY,
+    last_created_at  TIMESTAMPTZ NOT NULL,
+    last_listing_id  TEXT        NOT NULL,
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 12. Bảng daily_shop_counts: số listing mới của mỗi shop theo ngày báo cáo
+CREATE TABLE IF NOT EXISTS daily_shop_counts (
+    day         DATE        NOT NULL,
+    shop_id     BIGINT      NOT NULL,
+    new_count   INTEGER     NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (day, shop_id)
+);
+
+-- ── THÔNG BÁO ────────────────────────────────────────────────────────────────
+
+-- 13. Bảng notification_outbox: thông báo Telegram chờ gửi, ghi cùng transaction
+--     với dữ liệu sinh ra nó, delivery worker gửi bằng FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id               BIGSERIAL   PRIMARY KEY,
+    kind             TEXT        NOT NULL,
+    ref              TEXT        NOT NULL,
+    chat_id          BIGINT      NOT NULL,
+    text             TEXT        NOT NULL,
+    parse_mode       TEXT        NOT NULL DEFAULT 'Markdown',
+    status           TEXT        NOT NULL DEFAULT 'pending',
+    attempts         INTEGER     NOT NULL DEFAULT 0,
+    next_attempt_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_error       TEXT,
+    message_id       BIGINT,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at          TIMESTAMPTZ,
+    UNIQUE (kind, ref, chat_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox(next_attempt_at, id)
+    WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_outbox_chat_pending ON notification_outbox(chat_id, id)
+    WHERE status = 'pending';
@@ -0,0 +1,120 @@
+"""
+Benchmark dựng daily report: N+1 query (get_all_group_ids + get_shops_for_group
+cho từng group, cách cũ) so với build_daily_reports (1 query tổng hợp).
+Cần DATABASE_URL trỏ tới một database thử nghiệm.
+Chạy: python scripts/bench_daily_report.py [số_group] [shop_mỗi_group] [số_shop]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db.postgres import (
+    get_all_group_ids,
+    get_daily_shop_counts,
+    get_shops_for_group,
+    init_groups_tables,
+    init_listings_tables,
+    init_pg_pool,
+)
+from notifier.daily_report import build_daily_reports, render_daily_report
+
+# chat_id / shop_id âm để không đụng tới dữ liệu thật, xoá sạch sau khi chạy
+BENCH_CHAT_BASE = -8_000_000_000_000
+BENCH_SHOP_BASE = -9_000_000
+BENCH_SHOP_PREFIX = "bench_report_shop_"
+DAY = date(2000, 1, 1)
+
+
+async def seed(pg, n_groups: int, per_group: int, n_shops: int):
+    rng = random.Random(42)
+    shops = [(f"{BENCH_SHOP_PREFIX}{i}", BENCH_SHOP_BASE - i) for i in range(n_shops)]
+    groups = [(BENCH_CHAT_BASE - g, f"bench group {g}") for g in range(n_groups)]
+    subs = [
+        (chat_id, name, sid)
+        for chat_id, _ in groups
+        for name, sid in rng.sample(shops, min(per_group, n_shops))
+    ]
+    counts = [(DAY, sid, rng.randint(0, 50)) for _, sid in shops]
+    async with pg.acquire() as con:
+        await con.copy_records_to_table(
+            "shops", records=shops, columns=["shop_name", "shop_id"]
+        )
+        await con.copy_records_to_table(
+            "groups", records=groups, columns=["chat_id", "chat_title"]
+        )
+        await con.copy_records_to_table(
+            "group_subscriptions",
+            records=subs,
+            columns=["chat_id", "shop_name", "shop_id"],
+        )
+        await con.copy_records_to_table(
+            "daily_shop_counts",
+            records=counts,
+            columns=["day", "shop_id", "new_count"],
+        )
+    return len(subs)
+
+
+async def cleanup(pg):
+    async with pg.acquire() as con:
+        await con.execute("DELETE FROM groups WHERE chat_id <= $1;", BENCH_CHAT_BASE)
+        await con.execute(
+            "DELETE FROM shops WHERE shop_name LIKE $1;", BENCH_SHOP_PREFIX + "%"
+        )
+        await con.execute("DELETE FROM daily_shop_counts WHERE day = $1;", DAY)
+
+
+async def n_plus_one(pg):
+    """Cách cũ: 1 query lấy group, rồi 1 query shop cho mỗi group."""
+    counts = await get_daily_shop_counts(pg, DAY)
+    label = DAY.isoformat()
+    reports = []
+    for gid in await get_all_group_ids(pg):
+        shops = [
+            (name, sid, counts.get(sid, 0))
+            for name, sid in await get_shops_for_group(pg, gid)
+        ]
+        reports.append((gid, render_daily_report(gid, label, shops)))
+    return reports
+
+
+async def main():
+    n_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    per_group = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    n_shops = int(sys.argv[3]) if len(sys.argv) > 3 else 2_000
+
+    pg = await init_pg_pool()
+    await init_groups_tables(pg)
+    await init_listings_tables(pg)
+    await cleanup(pg)
+    n_subs = await seed(pg, n_groups, per_group, n_shops)
+
+    print(
+        f"Dựng report cho {n_groups} groups, {n_subs} subscriptions, "
+        f"{n_shops} shops\n"
+    )
+    try:
+        for name, run in (
+            ("N+1", lambda: n_plus_one(pg)),
+            ("1 query", lambda: build_daily_reports(pg, DAY)),
+        ):
+            started = time.perf_counter()
+            reports = await run()
+            elapsed = time.perf_counter() - started
+            print(
+                f"  {name:<8} {elapsed:8.3f}s  "
+                f"{len(reports) / elapsed:10.0f} reports/s  (reports={len(reports)})"
+            )
+    finally:
+        await cleanup(pg)
+        await pg.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark lưu bài đăng Facebook: save_fb_post từng bài (cách cũ) so với
+bulk_save_fb_posts theo page và cho cả lượt poll.
+Cần DATABASE_URL trỏ tới một database thử nghiệm.
+Chạy: python scripts/bench_fb_posts_writer.py [số_page] [bài_mỗi_page]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db.postgres import bulk_save_fb_posts, init_fb_tables, init_pg_pool, save_fb_post
+
+# page_id có tiền tố riêng để không đụng tới dữ liệu thật, xoá sạch sau khi chạy
+BENCH_PAGE_PREFIX = "bench_fb_page_"
+
+
+def make_pages(n_pages: int, per_page: int, tag: str):
+    now = datetime.now(pytz.UTC)
+    return [
+        [
+            (
+                f"{BENCH_PAGE_PREFIX}{p}",
+                f"{tag}-{p}-{i}",
+                f"Bench Page {p}",
+                now - timedelta(minutes=i),
+                "Bài viết mới của fanpage. " * 10,
+                f"https://scontent.xx/{tag}/{p}/{i}.jpg",
+                f"https://www.facebook.com/{p}/posts/{tag}{i}",
+                i * 3,
+                i,
+            )
+            for i in range(per_page)
+        ]
+        for p in range(n_pages)
+    ]
+
+
+async def per_row(pg, pages) -> int:
+    """Cách cũ: mỗi bài một save_fb_post (acquire + INSERT riêng)."""
+    inserted = 0
+    for rows in pages:
+        for row in rows:
+            inserted += await save_fb_post(pg, *row)
+    return inserted
+
+
+async def per_page(pg, pages) -> int:
+    """Mỗi page một bulk_save_fb_posts."""
+    inserted = 0
+    for rows in pages:
+        inserted += len(await bulk_save_fb_posts(pg, rows))
+    return inserted
+
+
+async def per_run(pg, pages) -> int:
+    """Cả lượt poll trong một bulk_save_fb_posts."""
+    return len(await bulk_save_fb_posts(pg, [r for rows in pages for r in rows]))
+
+
+async def cleanup(pg):
+    await pg.execute("DELETE FROM fb_posts WHERE page_id LIKE $1;", BENCH_PAGE_PREFIX + "%")
+    await pg.execute(
+        "DELETE FROM fb_page_cursors WHERE page_id LIKE $1;", BENCH_PAGE_PREFIX + "%"
+    )
+
+
+async def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    per_page_posts = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    total = n_pages * per_page_posts
+
+    pg = await init_pg_pool()
+    await init_fb_tables(pg)
+    await cleanup(pg)
+
+    print(f"Lưu {total} bài ({n_pages} pages × {per_page_posts})\n")
+    try:
+        for name, run in (
+            ("per-row", per_row),
+            ("per-page", per_page),
+            ("per-run", per_run),
+        ):
+            pages = make_pages(n_pages, per_page_posts, name)
+            started = time.perf_counter()
+            inserted = await run(pg, pages)
+            elapsed = time.perf_counter() - started
+            # Lần 2: toàn bộ đã tồn tại, chỉ còn chi phí dedup
+            started = time.perf_counter()
+            again = await run(pg, pages)
+            dedup = time.perf_counter() - started
+            print(
+                f"  {name:<9} {elapsed:8.3f}s  {total / elapsed:10.0f} posts/s  "
+                f"(inserted={inserted}), lần 2 {dedup:.3f}s (new={again})"
+            )
+    finally:
+        await cleanup(pg)
+        await pg.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark decode JSON response: json (stdlib, như resp.json()) so với orjson / msgspec
+qua api.json_codec. Mặc định dùng payload giả lập theo đúng cấu trúc response
+sidcorp /listings và tool.vn fanpage; có thể truyền file response đã ghi lại.
+Chạy: python scripts/bench_json_decode.py [số_lần] [file.json ...]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api import json_codec
+
+BACKENDS = ("json", "orjson", "msgspec")
+
+
+def sidcorp_page(n: int = 100) -> bytes:
+    items = [
+        {
+            "listing_id": 1500000000 + i,
+            "shop_id": 12345678,
+            "title": f"Personalized Custom Name Necklace Gift For Her #{i}",
+            "url": f"https://www.etsy.com/listing/{1500000000 + i}/custom-necklace",
+            "created_at": f"2026-10-17T{i % 24:02d}:{i % 60:02d}:00Z",
+            "price": {"amount": 2599 + i, "divisor": 100, "currency_code": "USD"},
+            "tags": ["necklace", "personalized", "gift", "custom", "jewelry"],
+            "images": [
+                {"url_570xN": f"https://i.etsystatic.com/{i}/r/il/{j}.jpg"}
+                for j in range(3)
+            ],
+            "state": "active",
+        }
+        for i in range(n)
+    ]
+    payload = {
+        "data": items,
+        "metadata": {"pagination": {"has_next": True, "total": 1000}},
+    }
+    return json.dumps(payload).encode()
+
+
+def toolvn_page(n: int = 20) -> bytes:
+    posts = [
+        {
+            "post_id": f"1000{i}",
+            "strong_id__": f"S:_I1000:{i}",
+            "creation_time": 1792000000 + i * 3600,
+            "message": {"text": "Bài viết mới của fanpage. " * 20},
+            "url": f"https://www.facebook.com/page/posts/1000{i}",
+            "attachments": [
+                {"media": {"image": {"uri": f"https://scontent.xx/{i}.jpg"}}}
+            ],
+            "feedback": {"reaction_count": i * 3, "comment_count": i},
+        }
+        for i in range(n)
+    ]
+    return json.dumps({"status": "success", "data": {"posts": posts}}).encode()
+
+
+def available_backends():
+    for name in BACKENDS:
+        backend = json_codec._load_backend(name)
+        if backend is not None:
+            yield backend
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = {}
+    for path in sys.argv[2:]:
+        with open(path, "rb") as f:
+            payloads[os.path.basename(path)] = f.read()
+    if not payloads:
+        payloads = {"sidcorp listings": sidcorp_page(), "tool.vn posts": toolvn_page()}
+
+    print(f"{iterations} lần decode mỗi payload, backend mặc định: {json_codec.BACKEND}\n")
+    for label, body in payloads.items():
+        print(f"{label} ({len(body) / 1024:.1f} KB)")
+        baseline = None
+        for name, decode in available_backends():
+            expected = json.loads(body)
+            assert decode(body) == expected, name
+            started = time.perf_counter()
+            for _ in range(iterations):
+                decode(body)
+            per_call = (time.perf_counter() - started) / iterations
+            baseline = baseline or per_call
+            print(
+                f"  {name:<8} {per_call * 1e6:8.1f} µs/decode  "
+                f"{len(body) / per_call / 1024 / 1024:8.1f} MB/s  "
+                f"x{baseline / per_call:.2f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark ghi listing: per-row INSERT (cách cũ) so với bulk_upsert_listings.
+Cần DATABASE_URL trỏ tới một database thử nghiệm.
+Chạy: python scripts/bench_listings_writer.py [số_shop] [listing_mỗi_shop]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db.postgres import bulk_upsert_listings, init_listings_tables, init_pg_pool
+
+# shop_id âm để không đụng tới dữ liệu thật, xoá sạch sau khi chạy
+BENCH_SHOP_BASE = -9_000_000
+
+
+def make_rows(n_shops: int, per_shop: int, tag: str):
+    now = datetime.now(pytz.UTC)
+    return [
+        (
+            BENCH_SHOP_BASE - s,
+            f"{tag}-{s}-{i}",
+            f"https://www.etsy.com/listing/{tag}{s}{i}",
+            f"https://i.etsystatic.com/{tag}/{s}/{i}/il_570xN.jpg",
+            now - timedelta(minutes=i),
+        )
+        for s in range(n_shops)
+        for i in range(per_shop)
+    ]
+
+
+async def per_row(pg, rows) -> int:
+    """Cách cũ: mỗi listing một pg.execute, không giữ connection."""
+    inserted = 0
+    for shop_id, lid, url, img, dt in rows:
+        result = await pg.execute(
+            "INSERT INTO listings (shop_id, listing_id, url, listing_images, created_at) "
+            "VALUES ($1,$2,$3,$4,$5) ON CONFLICT DO NOTHING;",
+            shop_id,
+            lid,
+            url,
+            img,
+            dt,
+        )
+        inserted += result.split()[-1] == "1"
+    return inserted
+
+
+async def bulk(pg, rows, per_shop: int) -> int:
+    """Cách mới: mỗi shop một transaction."""
+    inserted = 0
+    for i in range(0, len(rows), per_shop):
+        inserted += await bulk_upsert_listings(pg, rows[i : i + per_shop])
+    return inserted
+
+
+async def cleanup(pg, n_shops: int):
+    await pg.execute(
+        "DELETE FROM listings WHERE shop_id <= $1 AND shop_id > $2;",
+        BENCH_SHOP_BASE,
+        BENCH_SHOP_BASE - n_shops,
+    )
+
+
+async def main():
+    n_shops = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_shop = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    total = n_shops * per_shop
+
+    pg = await init_pg_pool()
+    await init_listings_tables(pg)
+    await cleanup(pg, n_shops)
+
+    print(f"Ghi {total} listings ({n_shops} shops × {per_shop})\n")
+    for name, run in (
+        ("per-row", lambda rows: per_row(pg, rows)),
+        ("bulk", lambda rows: bulk(pg, rows, per_shop)),
+    ):
+        rows = make_rows(n_shops, per_shop, name)
+        started = time.perf_counter()
+        inserted = await run(rows)
+        elapsed = time.perf_counter() - started
+        print(
+            f"  {name:<8} {elapsed:8.3f}s  {total / elapsed:10.0f} rows/s  "
+            f"(inserted={inserted})"
+        )
+
+    await cleanup(pg, n_shops)
+    await pg.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Benchmark resolve shopId: đọc cả trang (resp.text + re.search) so với scan_shop_id
+(đọc từng chunk, dừng khi thấy shopId). Dùng một server aiohttp cục bộ trả về
+trang shop giả lập, phát dữ liệu với băng thông giới hạn như khi tải từ Etsy.
+Chạy: python scripts/bench_shop_id_scan.py [kích_thước_KB] [vị_trí_%] [số_lần]
+"""
+
+import asyncio
+import os
+import re
+import sys
+import time
+
+from aiohttp import web
+import aiohttp
+
+# Benchmark gọi server cục bộ, không đi qua proxies.txt
+os.environ.setdefault("USE_PROXIES", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.client import scan_shop_id
+
+CHUNK = 16 * 1024
+BANDWIDTH = 4 * 1024 * 1024  # bytes/giây server phát ra
+SHOP_ID = "12345678"
+
+
+def make_page(size: int, position: float) -> bytes:
+    filler = b'<div class="wt-grid__item">lorem ipsum dolor sit amet</div>\n'
+    body = filler * (size // len(filler) + 1)
+    marker = f'<script>{{"shop_name":"Bench","shopId":{SHOP_ID},"x":1}}</script>'.encode()
+    at = int(len(body) * position)
+    return (body[:at] + marker + body[at:])[:size]
+
+
+async def start_server(page: bytes) -> web.AppRunner:
+    async def handler(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/html"})
+        resp.content_length = len(page)
+        await resp.prepare(request)
+        try:
+            for i in range(0, len(page), CHUNK):
+                await resp.write(page[i : i + CHUNK])
+                await asyncio.sleep(CHUNK / BANDWIDTH)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/shop/bench", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 8765).start()
+    return runner
+
+
+async def full_read(session, url):
+    async with session.get(url) as resp:
+        html = await resp.text()
+    m = re.search(r'"(?:shopId|shop_id|deep_link_shop_id)"\s*:\s*"?(\d+)"?', html)
+    return (m.group(1) if m else None), len(html.encode())
+
+
+async def streaming(session, url):
+    async with session.get(url) as resp:
+        return await scan_shop_id(resp)
+
+
+async def main():
+    size = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 400 * 1024
+    position = float(sys.argv[2]) / 100 if len(sys.argv) > 2 else 0.15
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    runner = await start_server(make_page(size, position))
+    url = "http://127.0.0.1:8765/shop/bench"
+    print(
+        f"Trang {size // 1024} KB, shopId ở {position:.0%}, {iterations} lần, "
+        f"băng thông {BANDWIDTH // 1024 // 1024} MB/s\n"
+    )
+    async with aiohttp.ClientSession() as session:
+        for name, fn in (("full read", full_read), ("streaming", streaming)):
+            total_bytes = 0
+            started = time.perf_counter()
+            for _ in range(iterations):
+                sid, n_bytes = await fn(session, url)
+                assert sid == SHOP_ID, sid
+                total_bytes += n_bytes
+            elapsed = time.perf_counter() - started
+            print(
+                f"  {name:<10} {elapsed / iterations * 1000:8.1f} ms/lookup  "
+                f"{total_bytes / iterations / 1024:8.1f} KB/lookup"
+            )
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
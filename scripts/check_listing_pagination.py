@@ -0,0 +1,148 @@
+"""
+Kiểm tra phân trang của iter_listing_pages (fan-out + prefetch) trên một shop
+giả lập trong bộ nhớ: mọi offset chỉ được tải đúng một lần và không listing
+mới nào bị bỏ sót; page lỗi giữa chừng thì fetch_new_listings không dời
+high-water mark. Không cần mạng hay database.
+Chạy: python scripts/check_listing_pagination.py
+"""
+
+import asyncio
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from poller import poller
+
+LIMIT = 100
+NOW = datetime(2000, 1, 1, tzinfo=pytz.UTC)
+
+
+def make_shop(n: int, sparse: int) -> list[dict]:
+    """
+    n listing theo created desc: `sparse` listing đầu cách nhau 3 phút, sau đó 1 phút,
+    nên fan-out (ước lượng từ page đầu) thiếu page và phải phân trang tiếp.
+    """
+    items, created = [], NOW
+    for i in range(n):
+        items.append(
+            {
+                "listing_id": i,
+                "url": f"https://etsy.example/listing/{i}",
+                "created_at": created.isoformat(),
+            }
+        )
+        created -= timedelta(minutes=3 if i < sparse else 1)
+    return items
+
+
+def install_fake_api(shop: list[dict], offsets: list[int], fail_at=None) -> None:
+    """Thay các hàm gọi API/DB của poller bằng shop giả lập; `fail_at`: offset lỗi."""
+
+    async def fake_fetch(sess, shop_name, shop_id, offset, limit):
+        offsets.append(offset)
+        await asyncio.sleep(0)
+        if offset == fail_at:
+            return None
+        items = shop[offset : offset + limit]
+        metadata = {
+            "pagination": {"has_next": offset + limit < len(shop), "total": len(shop)}
+        }
+        return items, metadata
+
+    async def no_watermark(pg, shop_id):
+        return None
+
+    poller._fetch_listings_page = fake_fetch
+    poller.get_shop_watermark = no_watermark
+    poller.get_session = lambda name: None
+
+
+async def run_case(shop: list[dict], cutoff: datetime, prefetch: bool, fan_out: bool):
+    offsets: list[int] = []
+    install_fake_api(shop, offsets)
+
+    got = []
+    incomplete = False
+    try:
+        async for page in poller.iter_listing_pages(
+            None, "check", 1, cutoff, limit=LIMIT, prefetch=prefetch, fan_out=fan_out
+        ):
+            got.extend(lid for lid, _, _ in page.listings)
+    except poller.IncompleteListingWalk:
+        incomplete = True
+
+    in_window = [
+        str(it["listing_id"])
+        for it in shop
+        if datetime.fromisoformat(it["created_at"]) >= cutoff
+    ]
+    expected = in_window[: 10 * LIMIT]
+    # Chỉ báo dở dang khi chạm max_pages mà vẫn còn listing mới phía sau
+    assert incomplete == (len(in_window) > 10 * LIMIT), (
+        f"incomplete={incomplete} with {len(in_window)} listings in window"
+    )
+    dupes = sorted(off for off, n in Counter(offsets).items() if n > 1)
+    assert not dupes, f"offsets fetched more than once: {dupes} ({offsets})"
+    # Các page đã tải phải liền nhau từ 0, không nhảy qua page nào
+    assert sorted(offsets) == list(range(0, len(offsets) * LIMIT, LIMIT)), (
+        f"offsets skipped: {sorted(offsets)}"
+    )
+    assert got == expected, (
+        f"missing {len(set(expected) - set(got))} listings, offsets={offsets}"
+    )
+    return offsets
+
+
+async def check_failed_page_keeps_watermark(shop: list[dict]) -> None:
+    """Page 3 lỗi: 2 page đầu vẫn được ghi nhưng high-water mark không dời."""
+    offsets: list[int] = []
+    install_fake_api(shop, offsets, fail_at=2 * LIMIT)
+    stored: list = []
+    marks: list = []
+
+    async def fake_upsert(pg, rows, watermarks=None, count_day=None):
+        stored.extend(rows)
+        marks.extend(watermarks or [])
+        return len(rows)
+
+    async def no_images(sess, shop_name, listing_ids):
+        return {}
+
+    poller.bulk_upsert_listings = fake_upsert
+    poller.fetch_listing_images = no_images
+    cutoff = NOW - timedelta(minutes=1400)
+    for prefetch in (False, True):
+        for fan_out in (False, True):
+            stored.clear()
+            marks.clear()
+            offsets.clear()
+            poller.settings.LISTINGS_PREFETCH = prefetch
+            poller.settings.LISTINGS_FANOUT = fan_out
+            await poller.fetch_new_listings(None, "check", 1, cutoff)
+            assert not marks, f"watermark moved after a failed page: {marks}"
+            assert len(stored) >= 2 * LIMIT, f"only {len(stored)} rows stored"
+
+
+async def main():
+    shop = make_shop(1200, sparse=150)
+    cases = 0
+    for minutes in range(60, 1500, 20):
+        cutoff = NOW - timedelta(minutes=minutes)
+        for prefetch in (False, True):
+            for fan_out in (False, True):
+                await run_case(shop, cutoff, prefetch, fan_out)
+                cases += 1
+    await check_failed_page_keeps_watermark(shop)
+    print(
+        f"OK: {cases} cases, every offset fetched once, no listing missed; "
+        f"failed page keeps the watermark"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+import logging
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Circuit của upstream đang mở: request bị từ chối ngay, không gửi đi."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} unavailable, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một upstream host.
+
+    - closed: request đi bình thường, đếm lỗi liên tiếp.
+    - open: sau `failure_threshold` lỗi liên tiếp, mọi request fail ngay
+      trong `reset_timeout` giây.
+    - half_open: hết thời gian chờ, cho một request thăm dò đi qua;
+      thành công → closed, thất bại → open lại.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self) -> None:
+        """Raise UpstreamUnavailable nếu request không được phép đi qua."""
+        if self.state == self.OPEN:
+            if self.retry_in > 0:
+                raise UpstreamUnavailable(self.host, self.retry_in)
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"[CIRCUIT] {self.host} half-open, probing")
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise UpstreamUnavailable(self.host, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"[CIRCUIT] {self.host} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Request kết thúc mà không nói được gì về upstream (vd: lỗi proxy)."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.error(
+                    f"[CIRCUIT] {self.host} open after {self.failures} failures, "
+                    f"fast-failing for {self.reset_timeout:.0f}s"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """Trả về circuit breaker dùng chung cho host của url."""
+    host = urlsplit(url).hostname or url
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(
+            host,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+        )
+    return breaker
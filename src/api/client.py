@@ -2,10 +2,15 @@ import asyncio
 import logging
 import re
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Tuple
 
 import aiohttp
 
+from api.http_client import get_session
+from api.json_codec import read_json
+from api.proxy_pool import PROXY_BLOCK_STATUSES, get_proxy_pool
+from api.rate_limiter import get_rate_limiter, parse_retry_after
+from api.shop_id_cache import shop_id_cache
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -13,88 +18,178 @@ logger = logging.getLogger(__name__)
 BASE = "https://www.etsy.com"
 TOOLVN_FB_URL = "https://tool.vn/api/facebook/get-post-facebook"
 
+SHOP_ID_RE = re.compile(rb'"(?:shopId|shop_id|deep_link_shop_id)"\s*:\s*"?(\d+)"?')
+SHOP_PAGE_CHUNK = 16 * 1024
 
-async def get_shop_id(session: aiohttp.ClientSession, shop_name: str) -> Optional[str]:
+
+class ShopIdMatcher:
+    """
+    Tìm shopId tăng dần trên các chunk bytes của trang shop.
+    Giữ lại phần đuôi của chunk trước để bắt được match bị cắt giữa 2 chunk.
+    """
+
+    def __init__(self, overlap: int = 256):
+        self.overlap = overlap
+        self.bytes_seen = 0
+        self._buf = b""
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """Trả về shopId ngay khi tìm thấy một match chắc chắn đã đầy đủ."""
+        self.bytes_seen += len(chunk)
+        data = self._buf + chunk
+        m = SHOP_ID_RE.search(data)
+        if m and m.end(1) < len(data):
+            return m.group(1).decode()
+        # Chưa match, hoặc dãy số có thể còn tiếp ở chunk sau
+        self._buf = data[m.start():] if m else data[-self.overlap:]
+        return None
+
+    def finish(self) -> Optional[str]:
+        """Gọi khi hết response: match còn lại trong buffer (nếu có)."""
+        m = SHOP_ID_RE.search(self._buf)
+        return m.group(1).decode() if m else None
+
+
+async def scan_shop_id(resp: aiohttp.ClientResponse) -> Tuple[Optional[str], int]:
+    """
+    Đọc trang shop theo từng chunk và dừng ngay khi thấy shopId,
+    đóng connection thay vì tải nốt phần còn lại của trang.
+
+    Returns:
+        (shop_id, số bytes đã đọc).
+    """
+    matcher = ShopIdMatcher()
+    async for chunk in resp.content.iter_chunked(SHOP_PAGE_CHUNK):
+        sid = matcher.feed(chunk)
+        if sid:
+            resp.close()
+            return sid, matcher.bytes_seen
+    return matcher.finish(), matcher.bytes_seen
+
+
+async def _fetch_shop_id(
+    session: aiohttp.ClientSession, shop_name: str
+) -> Tuple[Optional[str], bool]:
+    """
+    Tải trang shop trên Etsy và tìm shopId.
+
+    Returns:
+        (shop_id, definitive). definitive=False khi lỗi tạm thời (không nên cache).
+    """
     url = f"{BASE}/shop/{shop_name}"
-    async with session.get(url) as resp:
-        html = await resp.text()
-    m = re.search(r'"(?:shopId|shop_id|deep_link_shop_id)"\s*:\s*"?(\d+)"?', html)
-    if m:
-        sid = m.group(1)
-        print(f"[API] Found shopId={sid} for {shop_name}")
-        return sid
+    async with get_proxy_pool().use() as lease, session.get(
+        url, proxy=lease.url, proxy_auth=lease.auth
+    ) as resp:
+        if resp.status in PROXY_BLOCK_STATUSES:
+            lease.fail()
+        if resp.status != 200:
+            print(f"[API] {shop_name} shop page → HTTP {resp.status}")
+            return None, resp.status == 404
+        sid, n_bytes = await scan_shop_id(resp)
+    if sid:
+        print(f"[API] Found shopId={sid} for {shop_name} after {n_bytes} bytes")
+        return sid, True
     else:
         print(f"[API] Cannot find shopId for {shop_name}")
-        return None
+        return None, True
 
 
-async def fetch_recent_listings(
-    shop_name: str, cutoff: datetime, limit: int = 100
-) -> List[Dict[str, datetime]]:
-    listings = []
-    offset = 0
+async def get_shop_id(session: aiohttp.ClientSession, shop_name: str) -> Optional[str]:
+    """Resolve shop_id qua cache (LRU + Redis), chỉ tải trang shop khi cache miss."""
+    hit, sid = await shop_id_cache.get(shop_name)
+    if hit:
+        return sid
+    sid, definitive = await _fetch_shop_id(session, shop_name)
+    if definitive:
+        await shop_id_cache.set(shop_name, sid)
+    return sid
 
-    async with aiohttp.ClientSession() as session:
-        shop_id = await get_shop_id(session, shop_name)
-        if not shop_id:
-            return []
 
-        while True:
-            api = (
-                f"{BASE}/api/v3/internal/shops/{shop_id}/listings/active"
-                f"?limit={limit}&offset={offset}"
-                "&sort_on=created&sort_order=desc"
-            )
-            print(f"[API] GET {api}")
-            async with session.get(api) as resp:
-                if resp.status != 200:
-                    print(f"[API] {shop_name} offset={offset} → HTTP {resp.status}")
-                    break
-                data = await resp.json()
-            results = data.get("results", [])
-            print(
-                f"[API] {shop_name}: fetched {len(results)} items " f"(offset={offset})"
-            )
-            if not results:
-                break
+async def resolve_shop_ids(
+    shop_names: Iterable[str], concurrency: int = 10
+) -> Dict[str, Optional[str]]:
+    """
+    Resolve shop_id cho nhiều shop cùng lúc. Shop đã cache không tốn request nào,
+    các shop còn lại được tải song song tối đa `concurrency` trang.
 
-            for item in results:
-                ts = item.get("creation_tsz")
-                if not ts:
-                    continue
-                created = datetime.fromtimestamp(ts, tz=timezone.utc)
-                if created < cutoff:
-                    return listings
-                listings.append(
-                    {"listing_id": str(item["listing_id"]), "created": created}
-                )
+    Returns:
+        dict shop_name → shop_id (None nếu không tìm thấy hoặc lỗi).
+    """
+    session = get_session("etsy")
+    sem = asyncio.Semaphore(concurrency)
+    names = list(dict.fromkeys(shop_names))
 
-            offset += limit
+    async def _resolve(name: str) -> Optional[str]:
+        hit, sid = await shop_id_cache.get(name)
+        if hit:
+            return sid
+        async with sem:
+            try:
+                sid, definitive = await _fetch_shop_id(session, name)
+                if definitive:
+                    await shop_id_cache.set(name, sid)
+                return sid
+            except Exception as e:
+                logger.warning(f"[API] Resolve shopId failed for {name}: {e}")
+                return None
+
+    results = await asyncio.gather(*(_resolve(n) for n in names))
+    return dict(zip(names, results))
 
-    return listings
 
+async def iter_recent_listings(
+    shop_name: str, cutoff: datetime, limit: int = 100
+) -> AsyncIterator[Dict[str, datetime]]:
+    """
+    Yield từng listing (mới nhất trước) ngay khi parse xong mỗi page,
+    dừng khi gặp listing cũ hơn cutoff.
+    """
+    offset = 0
+
+    session = get_session("etsy")
+    shop_id = await get_shop_id(session, shop_name)
+    if not shop_id:
+        return
 
-# Headers dùng chung cho mọi request tới tool.vn
-TOOLVN_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/122.0.0.0 Safari/537.36"
-    ),
-    "Content-Type": "application/x-www-form-urlencoded",
-    "Accept": "application/json, text/plain, */*",
-    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
-    "Origin": "https://tool.vn",
-    "Referer": "https://tool.vn/",
-}
+    while True:
+        api = (
+            f"{BASE}/api/v3/internal/shops/{shop_id}/listings/active"
+            f"?limit={limit}&offset={offset}"
+            "&sort_on=created&sort_order=desc"
+        )
+        print(f"[API] GET {api}")
+        async with get_proxy_pool().use() as lease, session.get(
+            api, proxy=lease.url, proxy_auth=lease.auth
+        ) as resp:
+            if resp.status in PROXY_BLOCK_STATUSES:
+                lease.fail()
+            if resp.status != 200:
+                print(f"[API] {shop_name} offset={offset} → HTTP {resp.status}")
+                return
+            data = await read_json(resp)
+        results = data.get("results", [])
+        print(
+            f"[API] {shop_name}: fetched {len(results)} items " f"(offset={offset})"
+        )
+        if not results:
+            return
 
+        for item in results:
+            ts = item.get("creation_tsz")
+            if not ts:
+                continue
+            created = datetime.fromtimestamp(ts, tz=timezone.utc)
+            if created < cutoff:
+                return
+            yield {"listing_id": str(item["listing_id"]), "created": created}
 
-def create_toolvn_session() -> aiohttp.ClientSession:
-    """Tạo một aiohttp session dùng chung cho nhiều request tới tool.vn."""
-    return aiohttp.ClientSession(
-        headers=TOOLVN_HEADERS,
-        timeout=aiohttp.ClientTimeout(total=60),
-    )
+        offset += limit
+
+
+async def fetch_recent_listings(
+    shop_name: str, cutoff: datetime, limit: int = 100
+) -> List[Dict[str, datetime]]:
+    return [item async for item in iter_recent_listings(shop_name, cutoff, limit)]
 
 
 async def fetch_fb_posts(
@@ -107,7 +202,7 @@ async def fetch_fb_posts(
         page_id: Facebook page ID.
         limit: Số lượng bài đăng cần lấy.
         session: aiohttp session dùng chung (tái sử dụng connection pool).
-                 Nếu None sẽ tự tạo session mới.
+                 Nếu None sẽ dùng session tool.vn của process.
 
     Returns:
         Danh sách các bài đăng (mỗi bài là một dict).
@@ -117,50 +212,54 @@ async def fetch_fb_posts(
     max_attempts = 3
     backoff = 2.0
 
-    # Dùng session được truyền vào hoặc tự tạo mới
-    own_session = session is None
-    sess = session or create_toolvn_session()
+    # Dùng session được truyền vào hoặc session dùng chung của process
+    sess = session or get_session("toolvn")
+    limiter = get_rate_limiter(TOOLVN_FB_URL)
 
-    try:
-        for attempt in range(1, max_attempts + 1):
-            try:
-                async with sess.post(
-                    url,
-                    data={"id": page_id, "limit": limit},
-                ) as resp:
-                    resp.raise_for_status()
-                    data = await resp.json(content_type=None)
-
-                if isinstance(data, dict):
-                    inner = data.get("data") or {}
-                    if isinstance(inner, dict) and "posts" in inner:
-                        return inner["posts"]
-                    if "posts" in data:
-                        return data["posts"]
-                if isinstance(data, list):
-                    return data
-                logger.warning(
-                    f"[FB] Unexpected response format for page {page_id}: {str(data)[:200]}"
-                )
-                return []
-
-            except (asyncio.TimeoutError, aiohttp.ServerConnectionError, aiohttp.ServerDisconnectedError) as e:
-                logger.warning(
-                    f"[FB] Attempt {attempt}/{max_attempts} transient error for page {page_id}: "
-                    f"{type(e).__name__}: {e}"
-                )
-                if attempt < max_attempts:
-                    await asyncio.sleep(backoff)
-                    backoff *= 2
-                else:
-                    raise
-            except aiohttp.ClientResponseError as e:
-                logger.error(
-                    f"[FB] HTTP error {e.status} for page {page_id}: {e.message}"
-                )
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await limiter.acquire()
+            async with sess.post(
+                url,
+                data={"id": page_id, "limit": limit},
+            ) as resp:
+                limiter.on_response(resp.status, parse_retry_after(resp.headers))
+                if resp.status == 429 and attempt < max_attempts:
+                    # Limiter đã hạ tốc độ / chặn theo Retry-After, thử lại
+                    logger.warning(
+                        f"[FB] Attempt {attempt}/{max_attempts} rate limited for page {page_id}"
+                    )
+                    continue
+                resp.raise_for_status()
+                data = await read_json(resp)
+
+            if isinstance(data, dict):
+                inner = data.get("data") or {}
+                if isinstance(inner, dict) and "posts" in inner:
+                    return inner["posts"]
+                if "posts" in data:
+                    return data["posts"]
+            if isinstance(data, list):
+                return data
+            logger.warning(
+                f"[FB] Unexpected response format for page {page_id}: {str(data)[:200]}"
+            )
+            return []
+
+        except (asyncio.TimeoutError, aiohttp.ServerConnectionError, aiohttp.ServerDisconnectedError) as e:
+            logger.warning(
+                f"[FB] Attempt {attempt}/{max_attempts} transient error for page {page_id}: "
+                f"{type(e).__name__}: {e}"
+            )
+            if attempt < max_attempts:
+                await asyncio.sleep(backoff)
+                backoff *= 2
+            else:
                 raise
-    finally:
-        if own_session:
-            await sess.close()
+        except aiohttp.ClientResponseError as e:
+            logger.error(
+                f"[FB] HTTP error {e.status} for page {page_id}: {e.message}"
+            )
+            raise
 
     return []
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Dict
+
+import aiohttp
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/122.0.0.0 Safari/537.36"
+)
+
+# Headers dùng chung cho mọi request tới tool.vn
+TOOLVN_HEADERS = {
+    "User-Agent": BROWSER_USER_AGENT,
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+    "Origin": "https://tool.vn",
+    "Referer": "https://tool.vn/",
+}
+
+# Cấu hình cho từng upstream: headers mặc định, giới hạn connection, timeout (giây)
+UPSTREAMS: Dict[str, dict] = {
+    "sidcorp": {
+        "headers": {"x-api-key": settings.API_KEY, "Accept": "application/json"},
+        "limit": 100,
+        "limit_per_host": 50,
+        "timeout": 30,
+    },
+    "etsy": {
+        "headers": {
+            "User-Agent": BROWSER_USER_AGENT,
+            "Accept-Language": "en-US,en;q=0.9",
+        },
+        "limit": 100,
+        "limit_per_host": 50,
+        "timeout": 30,
+    },
+    "toolvn": {
+        "headers": TOOLVN_HEADERS,
+        "limit": 20,
+        "limit_per_host": 20,
+        "timeout": 60,
+    },
+    "telegram": {
+        "headers": {"Accept": "application/json"},
+        "limit": 30,
+        "limit_per_host": 30,
+        "timeout": 30,
+    },
+}
+
+# Session dùng chung trong cả process, tạo lười theo upstream
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+
+def get_session(upstream: str) -> aiohttp.ClientSession:
+    """
+    Trả về aiohttp session dùng chung cho upstream (sidcorp, etsy, toolvn, telegram).
+    Connection được giữ keep-alive và DNS được cache giữa các lần gọi.
+    Không tự đóng session này — dùng close_sessions() khi process dừng.
+    """
+    sess = _sessions.get(upstream)
+    if sess is None or sess.closed:
+        cfg = UPSTREAMS[upstream]
+        connector = aiohttp.TCPConnector(
+            limit=cfg["limit"],
+            limit_per_host=cfg["limit_per_host"],
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True,
+        )
+        sess = aiohttp.ClientSession(
+            connector=connector,
+            headers=cfg["headers"],
+            timeout=aiohttp.ClientTimeout(total=cfg["timeout"]),
+        )
+        _sessions[upstream] = sess
+    return sess
+
+
+async def close_sessions() -> None:
+    """Đóng mọi session dùng chung, gọi một lần khi process dừng."""
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for sess in sessions:
+        if not sess.closed:
+            await sess.close()
+    if sessions:
+        # Cho các kết nối SSL thời gian đóng hẳn
+        await asyncio.sleep(0.25)
+        logger.info(f"[HTTP] Closed {len(sessions)} shared sessions")
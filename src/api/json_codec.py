@@ -0,0 +1,77 @@
+import json
+import logging
+from typing import Any, Callable, Optional, Tuple
+
+import aiohttp
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _stdlib_loads(data: bytes) -> Any:
+    return json.loads(data)
+
+
+def _load_backend(name: str) -> Optional[Tuple[str, Callable[[bytes], Any]]]:
+    """Trả về (tên, hàm decode bytes) cho backend được chọn, None nếu chưa cài."""
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return "orjson", orjson.loads
+    if name == "msgspec":
+        try:
+            import msgspec
+        except ImportError:
+            return None
+        return "msgspec", msgspec.json.Decoder().decode
+    if name == "json":
+        return "json", _stdlib_loads
+    return None
+
+
+def _select_backend(preferred: str) -> Tuple[str, Callable[[bytes], Any]]:
+    """
+    Chọn decoder theo JSON_DECODER: "auto" thử orjson → msgspec → json,
+    tên cụ thể mà chưa cài thì rơi về json của stdlib.
+    """
+    order = ("orjson", "msgspec", "json") if preferred == "auto" else (preferred, "json")
+    for name in order:
+        backend = _load_backend(name)
+        if backend is not None:
+            if preferred not in ("auto", backend[0]):
+                logger.warning(
+                    f"[JSON] Decoder '{preferred}' not available, using {backend[0]}"
+                )
+            return backend
+    return "json", _stdlib_loads
+
+
+BACKEND, _decode = _select_backend(settings.JSON_DECODER)
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Decode JSON trực tiếp từ body bytes bằng backend nhanh nhất đang có.
+    Lỗi của mọi backend đều được chuẩn hoá thành ValueError.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        return _decode(data)
+    except ValueError:
+        raise
+    except Exception as e:
+        # msgspec.DecodeError không kế thừa ValueError
+        raise ValueError(str(e)) from e
+
+
+async def read_json(resp: aiohttp.ClientResponse) -> Any:
+    """
+    Thay cho `resp.json()`: đọc body bytes rồi decode bằng `loads`, bỏ qua
+    kiểm tra Content-Type. Body vẫn được aiohttp giữ lại nên `resp.text()`
+    dùng được nếu decode lỗi.
+    """
+    return loads(await resp.read())
@@ -0,0 +1,182 @@
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import List, Optional
+
+import aiohttp
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Status cho thấy IP của proxy bị chặn hoặc bị giới hạn
+PROXY_BLOCK_STATUSES = {403, 407, 429}
+
+
+@dataclass
+class Proxy:
+    """Một proxy cùng các chỉ số sức khoẻ của nó."""
+
+    url: str
+    auth: Optional[aiohttp.BasicAuth] = None
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    latency: float = 1.0  # EWMA latency (giây)
+    error_rate: float = 0.0  # EWMA tỉ lệ lỗi
+    consecutive_errors: int = 0
+    strikes: int = 0  # Số lần đã bị cách ly liên tiếp
+    quarantined_until: float = 0.0
+
+    @property
+    def score(self) -> float:
+        """Điểm càng thấp càng tốt: latency phạt thêm theo tỉ lệ lỗi."""
+        return self.latency * (1.0 + 5.0 * self.error_rate)
+
+
+class ProxyLease:
+    """Proxy đang được một request sử dụng. url=None nghĩa là kết nối trực tiếp."""
+
+    def __init__(self, proxy: Optional[Proxy]):
+        self.proxy = proxy
+        self.failed = False
+
+    @property
+    def url(self) -> Optional[str]:
+        return self.proxy.url if self.proxy else None
+
+    @property
+    def auth(self) -> Optional[aiohttp.BasicAuth]:
+        return self.proxy.auth if self.proxy else None
+
+    def fail(self) -> None:
+        """Đánh dấu request thất bại do proxy (vd: HTTP 403/407/429 từ upstream)."""
+        self.failed = True
+
+
+class ProxyPool:
+    """
+    Pool proxy xoay vòng (round_robin) hoặc chọn proxy ít tải nhất (least_loaded).
+    Proxy lỗi liên tiếp bị cách ly với thời gian chờ tăng theo cấp số nhân.
+    """
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(
+        self,
+        proxies: List[Proxy],
+        strategy: str = "least_loaded",
+        error_threshold: int = 3,
+        base_cooldown: float = 30.0,
+        max_cooldown: float = 1800.0,
+    ):
+        self.proxies = proxies
+        self.strategy = strategy
+        self.error_threshold = error_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._rr = itertools.cycle(proxies) if proxies else None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ProxyPool":
+        """Đọc proxies.txt, mỗi dòng `host:port:user:pass` hoặc `host:port`."""
+        proxies = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    parts = line.strip().split(":")
+                    if len(parts) == 4:
+                        host, port, user, password = parts
+                        auth = aiohttp.BasicAuth(user, password)
+                    elif len(parts) == 2:
+                        host, port = parts
+                        auth = None
+                    else:
+                        continue
+                    proxies.append(Proxy(url=f"http://{host}:{port}", auth=auth))
+        logger.info(f"[PROXY] Loaded {len(proxies)} proxies from {path}")
+        return cls(proxies, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def _available(self) -> List[Proxy]:
+        now = time.monotonic()
+        return [p for p in self.proxies if p.quarantined_until <= now]
+
+    def pick(self) -> Optional[Proxy]:
+        """Chọn proxy cho request tiếp theo, None nếu không còn proxy khả dụng."""
+        available = self._available()
+        if not available:
+            if self.proxies:
+                logger.warning("[PROXY] All proxies quarantined, using direct connection")
+            return None
+        if self.strategy == "round_robin":
+            for proxy in self._rr:
+                if proxy.quarantined_until <= time.monotonic():
+                    return proxy
+        return min(available, key=lambda p: (p.in_flight, p.score))
+
+    def record(self, proxy: Proxy, ok: bool, latency: float) -> None:
+        """Cập nhật chỉ số sức khoẻ sau mỗi request."""
+        a = self.EWMA_ALPHA
+        proxy.requests += 1
+        proxy.error_rate = (1 - a) * proxy.error_rate + a * (0.0 if ok else 1.0)
+        if ok:
+            proxy.latency = (1 - a) * proxy.latency + a * latency
+            proxy.consecutive_errors = 0
+            proxy.strikes = 0
+            return
+
+        proxy.errors += 1
+        proxy.consecutive_errors += 1
+        if proxy.consecutive_errors >= self.error_threshold:
+            cooldown = min(self.base_cooldown * 2**proxy.strikes, self.max_cooldown)
+            proxy.strikes += 1
+            proxy.consecutive_errors = 0
+            proxy.quarantined_until = time.monotonic() + cooldown
+            logger.warning(
+                f"[PROXY] {proxy.url} quarantined for {cooldown:.0f}s "
+                f"(error rate {proxy.error_rate:.0%})"
+            )
+
+    @asynccontextmanager
+    async def use(self):
+        """
+        Mượn một proxy trong suốt block `async with`. Exception trong block
+        hoặc lease.fail() được tính là lỗi của proxy.
+        """
+        lease = ProxyLease(self.pick())
+        proxy = lease.proxy
+        if proxy is None:
+            yield lease
+            return
+        proxy.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield lease
+        except Exception:
+            lease.failed = True
+            raise
+        finally:
+            proxy.in_flight -= 1
+            self.record(proxy, not lease.failed, time.monotonic() - started)
+
+
+_pool: Optional[ProxyPool] = None
+
+
+def get_proxy_pool() -> ProxyPool:
+    """Proxy pool dùng chung của process, rỗng nếu USE_PROXIES tắt hoặc không có file."""
+    global _pool
+    if _pool is None:
+        if settings.USE_PROXIES:
+            _pool = ProxyPool.from_file(
+                settings.PROXY_FILE, strategy=settings.PROXY_STRATEGY
+            )
+        else:
+            _pool = ProxyPool([])
+    return _pool
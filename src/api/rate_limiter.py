@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (tốc độ khởi đầu, tốc độ tối đa) request/giây riêng cho một số host,
+# các host khác dùng RATE_LIMIT_RPS / RATE_LIMIT_MAX_RPS
+HOST_RATES: Dict[str, Tuple[float, float]] = {
+    "tool.vn": (2.0, 5.0),
+    "api.telegram.org": (settings.TELEGRAM_GLOBAL_RPS, settings.TELEGRAM_GLOBAL_RPS),
+}
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Đọc header Retry-After (số giây hoặc HTTP-date), trả về số giây cần chờ."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket cho một upstream host, dùng chung bởi mọi coroutine gọi host đó.
+
+    Tốc độ điều chỉnh theo AIMD: mỗi response thành công tăng thêm `increase`
+    req/s, mỗi 429/5xx giảm theo hệ số `decrease` (tối đa một lần mỗi
+    khoảng 1/rate để các response đang bay không cùng lúc đạp tốc độ xuống đáy).
+    Retry-After chặn toàn bộ host cho tới khi hết thời gian chờ.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+    ):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def burst(self) -> float:
+        return max(1.0, self.rate)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Chờ tới khi được phép gửi một request. Các coroutine được phục vụ FIFO."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def on_response(self, status: int, retry_after: Optional[float] = None) -> None:
+        """Điều chỉnh tốc độ theo status của response."""
+        now = time.monotonic()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = 0.0
+
+        if status == 429 or status >= 500:
+            if now - self._last_decrease >= 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+                logger.warning(
+                    f"[RATE] {self.host} -> {status}, rate lowered to {self.rate:.2f} req/s"
+                    + (f", blocked {retry_after:.0f}s" if retry_after else "")
+                )
+        elif status < 400:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_rate_limiter(url: str) -> AdaptiveRateLimiter:
+    """Trả về rate limiter dùng chung cho host của url."""
+    host = urlsplit(url).hostname or url
+    limiter = _limiters.get(host)
+    if limiter is None:
+        rate, max_rate = HOST_RATES.get(
+            host, (settings.RATE_LIMIT_RPS, settings.RATE_LIMIT_MAX_RPS)
+        )
+        limiter = _limiters[host] = AdaptiveRateLimiter(
+            host,
+            rate=rate,
+            min_rate=min(rate, settings.RATE_LIMIT_MIN_RPS),
+            max_rate=max(rate, max_rate),
+        )
+    return limiter
@@ -0,0 +1,74 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config.settings import settings
+from db.redis_client import get_cached_shop_id, set_cached_shop_id
+
+logger = logging.getLogger(__name__)
+
+
+class ShopIdCache:
+    """
+    Cache 2 tầng cho shop_name → shop_id: LRU trong process, sau đó Redis.
+    Shop không tìm thấy được cache với TTL ngắn hơn (negative cache).
+    Redis lỗi thì chỉ dùng tầng LRU, không làm hỏng việc resolve.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, negative_ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # shop_name → (shop_id hoặc None, thời điểm hết hạn)
+        self._lru: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+    @staticmethod
+    def _norm(shop_name: str) -> str:
+        return shop_name.strip().lower()
+
+    def _set_local(self, key: str, shop_id: Optional[str], ttl: int) -> None:
+        self._lru[key] = (shop_id, time.monotonic() + ttl)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def get(self, shop_name: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns:
+            (hit, shop_id). hit=True với shop_id=None nghĩa là đã biết shop không tồn tại.
+        """
+        key = self._norm(shop_name)
+        entry = self._lru.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._lru.move_to_end(key)
+                return True, entry[0]
+            del self._lru[key]
+
+        try:
+            cached = await get_cached_shop_id(key)
+        except Exception as e:
+            logger.debug(f"[API] Redis shop_id cache unavailable: {e}")
+            return False, None
+        if cached is None:
+            return False, None
+        shop_id = cached or None
+        self._set_local(key, shop_id, self.ttl if shop_id else self.negative_ttl)
+        return True, shop_id
+
+    async def set(self, shop_name: str, shop_id: Optional[str]) -> None:
+        key = self._norm(shop_name)
+        ttl = self.ttl if shop_id else self.negative_ttl
+        self._set_local(key, shop_id, ttl)
+        try:
+            await set_cached_shop_id(key, shop_id, ttl)
+        except Exception as e:
+            logger.debug(f"[API] Redis shop_id cache unavailable: {e}")
+
+
+shop_id_cache = ShopIdCache(
+    maxsize=settings.SHOP_ID_CACHE_SIZE,
+    ttl=settings.SHOP_ID_CACHE_TTL,
+    negative_ttl=settings.SHOP_ID_NEGATIVE_TTL,
+)
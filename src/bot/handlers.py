@@ -16,6 +16,7 @@ from db.postgres import (
     subscribe_fb_group,
     unsubscribe_fb_group,
     get_fb_pages_for_group,
+    set_group_fb_coalesce,
 )
 
 
@@ -260,6 +261,29 @@ async def cmd_listfb(message: types.Message):
     await message.reply(text, disable_web_page_preview=True)
 
 
+async def cmd_fbdigest(message: types.Message):
+    """
+    /fbdigest on|off — Gộp thông báo bài đăng Facebook thành ít message nhất
+    (on) hoặc gửi mỗi bài một message (off).
+    """
+    arg = message.get_args().strip().lower()
+    if arg not in ("on", "off"):
+        await message.reply("❌ Cú pháp: `/fbdigest on` hoặc `/fbdigest off`")
+        return
+
+    pg = await init_pg_pool()
+    await init_groups_tables(pg)
+    chat_id = message.chat.id
+    chat_title = message.chat.title or message.chat.username or str(chat_id)
+    await add_group(pg, chat_id, chat_title)
+    await set_group_fb_coalesce(pg, chat_id, arg == "on")
+    await message.reply(
+        "✅ Bài đăng Facebook mới sẽ được gộp thành ít tin nhắn nhất."
+        if arg == "on"
+        else "✅ Mỗi bài đăng Facebook mới sẽ được gửi thành một tin nhắn riêng."
+    )
+
+
 def register_handlers(dp: Dispatcher):
     dp.register_message_handler(cmd_start, commands=["start"])
     dp.register_message_handler(cmd_document, content_types=["document"])
@@ -268,3 +292,4 @@ def register_handlers(dp: Dispatcher):
     dp.register_message_handler(cmd_addfb, commands=["addfb"])
     dp.register_message_handler(cmd_removefb, commands=["removefb"])
     dp.register_message_handler(cmd_listfb, commands=["listfb"])
+    dp.register_message_handler(cmd_fbdigest, commands=["fbdigest"])
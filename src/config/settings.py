@@ -13,5 +13,107 @@ class Settings:
         "TOOLVN_API_KEY", ""
     )  # tool.vn API key for Facebook posts
 
+    # ── Thu thập listing Etsy ─────────────────────────────────────────────
+    # Số shop được xử lý song song trong collect_listings
+    COLLECT_CONCURRENCY: int = int(os.getenv("COLLECT_CONCURRENCY", "20"))
+    # Số request đồng thời tối đa tới cùng một upstream host
+    COLLECT_PER_HOST_LIMIT: int = int(os.getenv("COLLECT_PER_HOST_LIMIT", "10"))
+    # Thời gian tối đa (giây) cho một shop, quá thời gian sẽ bị huỷ
+    COLLECT_SHOP_TIMEOUT: float = float(os.getenv("COLLECT_SHOP_TIMEOUT", "300"))
+    # Số listing_id gửi trong một request /listing-images
+    IMAGE_BATCH_SIZE: int = int(os.getenv("IMAGE_BATCH_SIZE", "50"))
+    # Số batch ảnh gửi song song cho mỗi shop
+    IMAGE_BATCH_CONCURRENCY: int = int(os.getenv("IMAGE_BATCH_CONCURRENCY", "4"))
+    # Gửi trước request page listings kế tiếp trong lúc xử lý page hiện tại
+    LISTINGS_PREFETCH: bool = os.getenv("LISTINGS_PREFETCH", "1") == "1"
+    # Tải song song các page listings khi API trả về tổng số listing
+    LISTINGS_FANOUT: bool = os.getenv("LISTINGS_FANOUT", "1") == "1"
+
+    # ── Proxy cho request tới Etsy/sidcorp ───────────────────────────────
+    USE_PROXIES: bool = os.getenv("USE_PROXIES", "1") == "1"
+    PROXY_FILE: str = os.getenv("PROXY_FILE", "proxies.txt")
+    # round_robin hoặc least_loaded
+    PROXY_STRATEGY: str = os.getenv("PROXY_STRATEGY", "least_loaded")
+
+    # ── Rate limit theo upstream host (request/giây, điều chỉnh AIMD) ─────
+    RATE_LIMIT_RPS: float = float(os.getenv("RATE_LIMIT_RPS", "10"))
+    RATE_LIMIT_MIN_RPS: float = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.5"))
+    RATE_LIMIT_MAX_RPS: float = float(os.getenv("RATE_LIMIT_MAX_RPS", "50"))
+
+    # ── Circuit breaker theo upstream host ──────────────────────────────
+    # Số lỗi liên tiếp để mở circuit
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "10"))
+    # Thời gian (giây) circuit mở trước khi cho request thăm dò
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "60"))
+    # Số lượt thử lại các shop bị bỏ qua vì upstream unavailable
+    COLLECT_RETRY_ROUNDS: int = int(os.getenv("COLLECT_RETRY_ROUNDS", "3"))
+
+    # ── Cache shop_name → shop_id ────────────────────────────────────────
+    SHOP_ID_CACHE_SIZE: int = int(os.getenv("SHOP_ID_CACHE_SIZE", "10000"))
+    SHOP_ID_CACHE_TTL: int = int(os.getenv("SHOP_ID_CACHE_TTL", str(7 * 24 * 3600)))
+    # TTL cho shop không tìm thấy
+    SHOP_ID_NEGATIVE_TTL: int = int(os.getenv("SHOP_ID_NEGATIVE_TTL", "3600"))
+
+    # ── Decode JSON response: auto | orjson | msgspec | json ─────────────
+    JSON_DECODER: str = os.getenv("JSON_DECODER", "auto").lower()
+
+    # ── Gửi Telegram (giới hạn của Bot API) ──────────────────────────────
+    # Số message/giây tối đa cho toàn bot
+    TELEGRAM_GLOBAL_RPS: float = float(os.getenv("TELEGRAM_GLOBAL_RPS", "25"))
+    # Khoảng cách tối thiểu (giây) giữa 2 message tới cùng một chat
+    TELEGRAM_CHAT_INTERVAL: float = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+    # Số message/phút tối đa tới một group
+    TELEGRAM_GROUP_PER_MINUTE: int = int(os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20"))
+    TELEGRAM_MAX_ATTEMPTS: int = int(os.getenv("TELEGRAM_MAX_ATTEMPTS", "5"))
+    # Mặc định gộp thông báo Facebook của một group vào ít message nhất
+    # (group có thể đổi bằng /fbdigest on|off)
+    FB_COALESCE: bool = os.getenv("FB_COALESCE", "1") == "1"
+
+    # ── Lịch poll Facebook page theo tần suất đăng bài ───────────────────
+    # 0 → poll mọi page mỗi 6h như trước
+    FB_ADAPTIVE_POLLING: bool = os.getenv("FB_ADAPTIVE_POLLING", "1") == "1"
+    # Chu kỳ (phút) kiểm tra page nào đã tới hạn poll
+    FB_POLL_TICK_MINUTES: int = int(os.getenv("FB_POLL_TICK_MINUTES", "10"))
+    FB_POLL_MIN_INTERVAL: int = int(os.getenv("FB_POLL_MIN_INTERVAL", "3600"))
+    FB_POLL_MAX_INTERVAL: int = int(os.getenv("FB_POLL_MAX_INTERVAL", "172800"))
+    # Số bài mới mong muốn mỗi lần poll (interval ≈ số này / tần suất đăng)
+    FB_TARGET_POSTS_PER_POLL: float = float(
+        os.getenv("FB_TARGET_POSTS_PER_POLL", "1.0")
+    )
+    # Số ngày lịch sử fb_posts dùng để ước lượng tần suất đăng
+    FB_RATE_HISTORY_DAYS: int = int(os.getenv("FB_RATE_HISTORY_DAYS", "14"))
+    FB_CREDITS_PER_POLL: int = int(os.getenv("FB_CREDITS_PER_POLL", "30"))
+    # tool.vn tính credits theo limit, tối thiểu FB_CREDITS_PER_POLL mỗi lần gọi
+    FB_CREDITS_PER_POST: int = int(os.getenv("FB_CREDITS_PER_POST", "10"))
+    # Các mức limit lần lượt thử mỗi lần poll (tối đa 20): chỉ tăng mức khi mọi
+    # bài trả về đều mới hơn cursor của page; rỗng / không hợp lệ → 3,10,20
+    FB_FETCH_LIMITS: tuple = tuple(
+        sorted(
+            min(int(x), 20)
+            for x in os.getenv("FB_FETCH_LIMITS", "3,10,20").split(",")
+            if x.strip() and int(x) > 0
+        )
+    ) or (3, 10, 20)
+    # Credits tool.vn tối đa mỗi ngày; 0 → bằng mức poll 6h/lần (số page × 4 lần)
+    FB_DAILY_CREDIT_BUDGET: int = int(os.getenv("FB_DAILY_CREDIT_BUDGET", "0"))
+
+    # ── Notification outbox (delivery worker) ────────────────────────────
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+    OUTBOX_CONCURRENCY: int = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+    # Thông báo đã nhận nhưng worker chết → gửi lại sau khoảng này (giây)
+    OUTBOX_LEASE_SECONDS: float = float(os.getenv("OUTBOX_LEASE_SECONDS", "600"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+
+    # ── Chạy phân tán qua hàng đợi Redis ─────────────────────────────────
+    # standalone: một process chạy tất cả; coordinator: lập lịch + đẩy task
+    # vào Redis; worker: nhận task từ Redis và thu thập; delivery: chỉ gửi
+    # thông báo từ notification_outbox (standalone và worker cũng tự gửi)
+    POLLER_MODE: str = os.getenv("POLLER_MODE", "standalone").lower()
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "10"))
+    # Worker không gia hạn lease trong khoảng này (crash) → task được giao lại
+    WORK_LEASE_SECONDS: float = float(os.getenv("WORK_LEASE_SECONDS", "120"))
+    WORK_MAX_ATTEMPTS: int = int(os.getenv("WORK_MAX_ATTEMPTS", "5"))
+
 
 settings = Settings()
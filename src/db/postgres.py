@@ -1,7 +1,9 @@
 import asyncpg
 import asyncio
 import logging
-from typing import List, Tuple, Set
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Set
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -123,7 +125,234 @@ async def get_seen_ids(pg_pool, shop_name: str) -> Set[str]:
     return {r["listing_id"] for r in rows}
 
 
+# ── XỬ LÝ LISTINGS ────────────────────────────────────────────────────────────
+LISTINGS_PARTITIONS = 16
+
+
+async def init_listings_tables(pg_pool) -> None:
+    """
+    Tạo bảng listings (partition theo hash shop_id) và shop_watermarks nếu chưa có.
+    """
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS listings (
+                shop_id        BIGINT      NOT NULL,
+                listing_id     TEXT        NOT NULL,
+                url            TEXT,
+                listing_images TEXT,
+                created_at     TIMESTAMPTZ,
+                first_seen_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at     TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (shop_id, listing_id)
+            ) PARTITION BY HASH (shop_id);
+            """
+        )
+        for i in range(LISTINGS_PARTITIONS):
+            await con.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS listings_p{i} PARTITION OF listings
+                    FOR VALUES WITH (MODULUS {LISTINGS_PARTITIONS}, REMAINDER {i});
+                """
+            )
+        await con.execute(
+            "CREATE INDEX IF NOT EXISTS idx_listings_shop_created "
+            "ON listings(shop_id, created_at DESC);"
+        )
+        # High-water mark: listing mới nhất đã thấy của mỗi shop
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shop_watermarks (
+                shop_id          BIGINT      PRIMARY KEY,
+                last_created_at  TIMESTAMPTZ NOT NULL,
+                last_listing_id  TEXT        NOT NULL,
+                updated_at       TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """
+        )
+        # Số listing mới của mỗi shop theo ngày báo cáo, cộng dồn khi ghi listings
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_shop_counts (
+                day         DATE        NOT NULL,
+                shop_id     BIGINT      NOT NULL,
+                new_count   INTEGER     NOT NULL DEFAULT 0,
+                updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (day, shop_id)
+            );
+            """
+        )
+
+
+async def migrate_legacy_listing_tables(pg_pool) -> int:
+    """
+    Chuyển dữ liệu từ các bảng cũ "listing_{shop_id}" sang bảng listings
+    rồi xoá bảng cũ. Mỗi bảng được chuyển trong một transaction riêng,
+    chạy lại nhiều lần vẫn an toàn.
+
+    Returns:
+        Số bảng cũ đã chuyển.
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT tablename FROM pg_tables
+             WHERE schemaname = current_schema()
+               AND tablename ~ '^listing_[0-9]+$';
+            """
+        )
+        for r in rows:
+            table = r["tablename"]
+            shop_id = int(table.split("_", 1)[1])
+            async with con.transaction():
+                await con.execute(
+                    f"""
+                    INSERT INTO listings (shop_id, listing_id, url, listing_images, created_at)
+                    SELECT $1, listing_id, url, listing_images, created_at
+                      FROM "{table}"
+                    ON CONFLICT (shop_id, listing_id) DO NOTHING;
+                    """,
+                    shop_id,
+                )
+                await con.execute(f'DROP TABLE "{table}";')
+        if rows:
+            # Khởi tạo high-water mark từ dữ liệu vừa chuyển
+            await con.execute(
+                """
+                INSERT INTO shop_watermarks (shop_id, last_created_at, last_listing_id)
+                SELECT DISTINCT ON (shop_id) shop_id, created_at, listing_id
+                  FROM listings
+                 WHERE created_at IS NOT NULL
+                 ORDER BY shop_id, created_at DESC
+                ON CONFLICT (shop_id) DO NOTHING;
+                """
+            )
+            logger.info(f"Migrated {len(rows)} legacy listing_* tables into listings")
+    return len(rows)
+
+
+async def get_shop_watermark(
+    pg_pool, shop_id: int
+) -> Optional[Tuple[datetime, str]]:
+    """
+    Trả về (last_created_at, last_listing_id) của shop, hoặc None nếu chưa có.
+    """
+    async with pg_pool.acquire() as con:
+        row = await con.fetchrow(
+            "SELECT last_created_at, last_listing_id FROM shop_watermarks WHERE shop_id = $1;",
+            shop_id,
+        )
+    return (row["last_created_at"], row["last_listing_id"]) if row else None
+
+
+async def bulk_upsert_listings(
+    pg_pool,
+    rows: List[Tuple[int, str, Optional[str], str, Optional[datetime]]],
+    watermarks: Optional[List[Tuple[int, datetime, str]]] = None,
+    count_day: Optional[date] = None,
+) -> int:
+    """
+    Ghi nhiều listing (có thể của nhiều shop) trong MỘT transaction bằng
+    INSERT ... SELECT FROM unnest(...), thay cho 1 round trip mỗi listing.
+    High-water mark của các shop được cập nhật trong cùng transaction.
+
+    Args:
+        rows: Danh sách (shop_id, listing_id, url, listing_images, created_at).
+        watermarks: Danh sách (shop_id, last_created_at, last_listing_id).
+        count_day: Nếu có, cộng số listing mới của từng shop vào
+            daily_shop_counts của ngày này, trong cùng transaction (ghi lại
+            cùng listing không làm tăng số đếm).
+
+    Returns:
+        Số listing MỚI thực sự được insert (không tính listing chỉ được cập nhật).
+    """
+    # ON CONFLICT DO UPDATE không cho phép trùng khoá trong cùng một lệnh
+    unique = {(r[0], r[1]): r for r in rows}
+    rows = list(unique.values())
+    if not rows and not watermarks:
+        return 0
+
+    async with pg_pool.acquire() as con:
+        async with con.transaction():
+            inserted = []
+            if rows:
+                shop_ids, listing_ids, urls, images, created = zip(*rows)
+                inserted = await con.fetch(
+                    """
+                    INSERT INTO listings (shop_id, listing_id, url, listing_images, created_at)
+                    SELECT * FROM unnest(
+                        $1::bigint[], $2::text[], $3::text[], $4::text[], $5::timestamptz[]
+                    )
+                    ON CONFLICT (shop_id, listing_id) DO UPDATE SET
+                        url            = EXCLUDED.url,
+                        listing_images = COALESCE(NULLIF(EXCLUDED.listing_images, ''),
+                                                  listings.listing_images),
+                        updated_at     = now()
+                    RETURNING shop_id, (xmax = 0) AS inserted;
+                    """,
+                    list(shop_ids),
+                    list(listing_ids),
+                    list(urls),
+                    list(images),
+                    list(created),
+                )
+            if count_day is not None:
+                per_shop: Dict[int, int] = {}
+                for r in inserted:
+                    if r["inserted"]:
+                        per_shop[r["shop_id"]] = per_shop.get(r["shop_id"], 0) + 1
+                if per_shop:
+                    await con.executemany(
+                        """
+                        INSERT INTO daily_shop_counts (day, shop_id, new_count)
+                        VALUES ($1, $2, $3)
+                        ON CONFLICT (day, shop_id) DO UPDATE SET
+                            new_count  = daily_shop_counts.new_count + EXCLUDED.new_count,
+                            updated_at = now();
+                        """,
+                        [(count_day, sid, n) for sid, n in per_shop.items()],
+                    )
+            if watermarks:
+                # Chỉ dời mark khi listing mới hơn mark hiện tại
+                await con.executemany(
+                    """
+                    INSERT INTO shop_watermarks (shop_id, last_created_at, last_listing_id)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (shop_id) DO UPDATE SET
+                        last_created_at = EXCLUDED.last_created_at,
+                        last_listing_id = EXCLUDED.last_listing_id,
+                        updated_at      = now()
+                     WHERE shop_watermarks.last_created_at < EXCLUDED.last_created_at;
+                    """,
+                    watermarks,
+                )
+    return sum(1 for r in inserted if r["inserted"])
+
+
+async def get_daily_shop_counts(pg_pool, day: date) -> Dict[int, int]:
+    """
+    Trả về shop_id → số listing mới đã ghi cho ngày báo cáo `day`.
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            "SELECT shop_id, new_count FROM daily_shop_counts WHERE day = $1;",
+            day,
+        )
+    return {r["shop_id"]: r["new_count"] for r in rows}
+
+
 # ── XỬ LÝ NHÓM & SUBSCRIPTIONS ─────────────────────────────────────────────────
+async def _migrate_groups_fb_coalesce(con) -> None:
+    """
+    Gộp thông báo Facebook theo group (NULL = theo FB_COALESCE). Chạy cả từ
+    init_fb_tables / init_outbox_table vì poller và delivery worker không gọi
+    init_groups_tables, mà deliver_batch đọc cột này.
+    """
+    await con.execute(
+        "ALTER TABLE IF EXISTS groups ADD COLUMN IF NOT EXISTS fb_coalesce BOOLEAN;"
+    )
+
+
 async def init_groups_tables(pg_pool) -> None:
     """
     Tạo hoặc migrate các bảng groups, shops, group_subscriptions nếu chưa.
@@ -143,6 +372,7 @@ async def init_groups_tables(pg_pool) -> None:
             );
             """
         )
+        await _migrate_groups_fb_coalesce(con)
         # Bảng shops
         await con.execute(
             """
@@ -276,6 +506,61 @@ async def get_all_group_ids(pg_pool) -> List[int]:
     return [r["chat_id"] for r in rows]
 
 
+async def get_subscribed_shops(pg_pool) -> List[Tuple[str, int]]:
+    """
+    Trả về mọi (shop_name, shop_id) được ít nhất một group đăng ký, trong 1 query.
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT DISTINCT s.shop_name, s.shop_id
+              FROM group_subscriptions gs
+              JOIN shops s ON s.shop_name = gs.shop_name
+             ORDER BY s.shop_name;
+            """
+        )
+    return [(r["shop_name"], r["shop_id"]) for r in rows]
+
+
+async def get_daily_report_rows(
+    pg_pool, day: date
+) -> List[Tuple[int, List[Tuple[str, int, int]]]]:
+    """
+    Lấy toàn bộ dữ liệu daily report trong MỘT query: mỗi group kèm danh sách
+    shop đã đăng ký và số listing mới của ngày `day`.
+
+    Returns:
+        Danh sách (chat_id, [(shop_name, shop_id, new_count), ...]); group chưa
+        đăng ký shop nào có danh sách rỗng.
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT g.chat_id,
+                   array_agg(s.shop_name ORDER BY s.shop_name)
+                       FILTER (WHERE s.shop_name IS NOT NULL) AS shop_names,
+                   array_agg(s.shop_id ORDER BY s.shop_name)
+                       FILTER (WHERE s.shop_name IS NOT NULL) AS shop_ids,
+                   array_agg(COALESCE(c.new_count, 0) ORDER BY s.shop_name)
+                       FILTER (WHERE s.shop_name IS NOT NULL) AS counts
+              FROM groups g
+              LEFT JOIN group_subscriptions gs ON gs.chat_id = g.chat_id
+              LEFT JOIN shops s ON s.shop_name = gs.shop_name
+              LEFT JOIN daily_shop_counts c ON c.day = $1 AND c.shop_id = s.shop_id
+             GROUP BY g.chat_id
+             ORDER BY g.chat_id;
+            """,
+            day,
+        )
+    return [
+        (
+            r["chat_id"],
+            list(zip(r["shop_names"] or [], r["shop_ids"] or [], r["counts"] or [])),
+        )
+        for r in rows
+    ]
+
+
 # ── FACEBOOK FANPAGE ────────────────────────────────────────────────────────────
 
 
@@ -339,6 +624,30 @@ async def init_fb_tables(pg_pool) -> None:
         await con.execute(
             "CREATE INDEX IF NOT EXISTS idx_fb_posts_created ON fb_posts(created_at DESC);"
         )
+        await _migrate_groups_fb_coalesce(con)
+        # Lịch poll riêng của từng page (adaptive polling)
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fb_page_schedule (
+                page_id           TEXT        PRIMARY KEY,
+                interval_seconds  INTEGER     NOT NULL,
+                next_poll_at      TIMESTAMPTZ NOT NULL,
+                last_polled_at    TIMESTAMPTZ,
+                created_at        TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """
+        )
+        # Bài mới nhất đã thấy của từng page, poll sau chỉ lấy bài mới hơn
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fb_page_cursors (
+                page_id     TEXT        PRIMARY KEY,
+                post_id     TEXT        NOT NULL,
+                created_at  TIMESTAMPTZ NOT NULL,
+                updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """
+        )
 
 
 async def add_fb_page(pg_pool, page_id: str, page_name: str) -> None:
@@ -405,6 +714,25 @@ async def get_fb_pages_for_group(pg_pool, chat_id: int) -> List[Tuple[str, str]]
     return [(r["page_id"], r["page_name"]) for r in rows]
 
 
+async def set_group_fb_coalesce(pg_pool, chat_id: int, enabled: bool) -> None:
+    """Bật/tắt gộp thông báo Facebook cho group."""
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            "UPDATE groups SET fb_coalesce = $2, updated_at = now() WHERE chat_id = $1;",
+            chat_id,
+            enabled,
+        )
+
+
+async def get_fb_coalesce_settings(pg_pool) -> Dict[int, bool]:
+    """Trả về chat_id → fb_coalesce của các group đã tự cấu hình."""
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            "SELECT chat_id, fb_coalesce FROM groups WHERE fb_coalesce IS NOT NULL;"
+        )
+    return {r["chat_id"]: r["fb_coalesce"] for r in rows}
+
+
 async def get_all_fb_page_subscriptions(pg_pool) -> List[Tuple[int, str, str]]:
     """
     Trả về danh sách (chat_id, page_id, page_name) của toàn bộ subscriptions.
@@ -453,12 +781,16 @@ async def save_fb_post(
     post_url: str,
     reaction_count: int,
     comment_count: int,
+    notifications: Optional[List[Tuple[int, str]]] = None,
 ) -> bool:
     """
     Lưu bài đăng Facebook vào fb_posts.
     Trả về True nếu là bài MỚI (chưa từng lưu), False nếu đã tồn tại.
+
+    notifications: (chat_id, text) cần gửi khi bài là bài mới, được ghi vào
+    notification_outbox trong cùng transaction với bài đăng.
     """
-    async with pg_pool.acquire() as con:
+    async with pg_pool.acquire() as con, con.transaction():
         result = await con.execute(
             """
             INSERT INTO fb_posts
@@ -477,5 +809,378 @@ async def save_fb_post(
             reaction_count,
             comment_count,
         )
-    # asyncpg trả về 'INSERT 0 1' nếu insert thành công, 'INSERT 0 0' nếu conflict
-    return result.split()[-1] == "1"
+        # asyncpg trả về 'INSERT 0 1' nếu insert thành công, 'INSERT 0 0' nếu conflict
+        is_new = result.split()[-1] == "1"
+        if is_new and notifications:
+            await _insert_outbox(con, "fb_post", f"{page_id}:{post_id}", notifications)
+    return is_new
+
+
+# Chỉ đẩy cursor tới, không bao giờ lùi về bài cũ hơn
+_ADVANCE_FB_CURSOR_SQL = """
+    INSERT INTO fb_page_cursors (page_id, post_id, created_at)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (page_id) DO UPDATE SET
+        post_id    = EXCLUDED.post_id,
+        created_at = EXCLUDED.created_at,
+        updated_at = now()
+    WHERE EXCLUDED.created_at >= fb_page_cursors.created_at;
+"""
+
+
+async def bulk_save_fb_posts(
+    pg_pool,
+    rows: List[Tuple[str, str, str, Optional[datetime], str, str, str, int, int]],
+    notifications: Optional[Dict[Tuple[str, str], List[Tuple[int, str]]]] = None,
+) -> Set[Tuple[str, str]]:
+    """
+    Lưu nhiều bài đăng (một page hoặc cả lượt poll) bằng MỘT lệnh
+    INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING RETURNING,
+    thay cho 1 round trip mỗi bài như save_fb_post.
+
+    Args:
+        rows: Danh sách (page_id, post_id, page_name, created_at, message,
+            image_url, post_url, reaction_count, comment_count).
+        notifications: (page_id, post_id) → [(chat_id, text)] cần gửi nếu bài
+            là bài mới; được ghi vào outbox trong cùng transaction, theo thứ tự
+            của `rows`.
+
+    Cursor (fb_page_cursors) của mỗi page được đẩy tới bài mới nhất trong
+    `rows` cùng transaction, nên không bao giờ vượt quá bài đã lưu.
+
+    Returns:
+        Tập (page_id, post_id) của các bài MỚI.
+    """
+    unique = {(r[0], r[1]): r for r in rows}
+    rows = list(unique.values())
+    if not rows:
+        return set()
+
+    cols = list(zip(*rows))
+    async with pg_pool.acquire() as con, con.transaction():
+        inserted = await con.fetch(
+            """
+            INSERT INTO fb_posts
+                (page_id, post_id, page_name, created_at, message,
+                 image_url, post_url, reaction_count, comment_count)
+            SELECT * FROM unnest(
+                $1::text[], $2::text[], $3::text[], $4::timestamptz[], $5::text[],
+                $6::text[], $7::text[], $8::int[], $9::int[]
+            )
+            ON CONFLICT (page_id, post_id) DO NOTHING
+            RETURNING page_id, post_id;
+            """,
+            *(list(c) for c in cols),
+        )
+        new = {(r["page_id"], r["post_id"]) for r in inserted}
+        newest: Dict[str, Tuple[str, datetime]] = {}
+        for page_id, post_id, _, created_at, *_ in rows:
+            if created_at is not None and (
+                page_id not in newest or created_at > newest[page_id][1]
+            ):
+                newest[page_id] = (post_id, created_at)
+        if newest:
+            await con.executemany(
+                _ADVANCE_FB_CURSOR_SQL,
+                [(pid, post_id, ts) for pid, (post_id, ts) in newest.items()],
+            )
+        if new and notifications:
+            await _insert_outbox_rows(
+                con,
+                [
+                    ("fb_post", f"{page_id}:{post_id}", chat_id, text)
+                    for page_id, post_id, *_ in rows
+                    if (page_id, post_id) in new
+                    for chat_id, text in notifications.get((page_id, post_id), [])
+                ],
+            )
+    return new
+
+
+async def advance_fb_page_cursor(
+    pg_pool, page_id: str, post_id: str, created_at: datetime
+) -> None:
+    """Đẩy cursor của page tới (post_id, created_at) nếu mới hơn cursor hiện tại."""
+    async with pg_pool.acquire() as con:
+        await con.execute(_ADVANCE_FB_CURSOR_SQL, page_id, post_id, created_at)
+
+
+async def get_fb_page_cursors(
+    pg_pool, page_ids: List[str]
+) -> Dict[str, Tuple[str, datetime]]:
+    """
+    Trả về page_id → (post_id, created_at) của bài mới nhất đã thấy.
+    Page chưa có cursor (dữ liệu cũ) lấy bài mới nhất trong fb_posts.
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT DISTINCT ON (page_id) page_id, post_id, created_at
+              FROM (
+                    SELECT page_id, post_id, created_at, 0 AS src
+                      FROM fb_page_cursors
+                     WHERE page_id = ANY($1::text[])
+                    UNION ALL
+                    SELECT page_id, post_id, created_at, 1 AS src
+                      FROM fb_posts
+                     WHERE page_id = ANY($1::text[]) AND created_at IS NOT NULL
+                   ) c
+             ORDER BY page_id, src, created_at DESC;
+            """,
+            page_ids,
+        )
+    return {r["page_id"]: (r["post_id"], r["created_at"]) for r in rows}
+
+
+async def get_fb_post_counts(pg_pool, since: datetime) -> Dict[str, int]:
+    """
+    Trả về page_id → số bài đăng có created_at từ `since`, hoặc từ lúc page
+    vào fb_page_schedule nếu muộn hơn (cùng khoảng với số ngày theo dõi).
+    """
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT p.page_id, count(*) AS n
+              FROM fb_posts p
+              LEFT JOIN fb_page_schedule s ON s.page_id = p.page_id
+             WHERE p.created_at >= GREATEST($1, s.created_at)
+             GROUP BY p.page_id;
+            """,
+            since,
+        )
+    return {r["page_id"]: r["n"] for r in rows}
+
+
+@asynccontextmanager
+async def try_advisory_lock(pg_pool, key: int) -> AsyncIterator[bool]:
+    """
+    Giữ advisory lock `key` (theo transaction) trong khối with; yield False
+    ngay nếu process khác đang giữ. Connection chết → lock tự nhả.
+    """
+    async with pg_pool.acquire() as con, con.transaction():
+        yield await con.fetchval("SELECT pg_try_advisory_xact_lock($1);", key)
+
+
+async def get_fb_page_schedule(
+    pg_pool,
+) -> Dict[str, Tuple[datetime, Optional[datetime], datetime]]:
+    """Trả về page_id → (next_poll_at, last_polled_at, created_at)."""
+    async with pg_pool.acquire() as con:
+        rows = await con.fetch(
+            """
+            SELECT page_id, next_poll_at, last_polled_at, created_at
+              FROM fb_page_schedule;
+            """
+        )
+    return {
+        r["page_id"]: (r["next_poll_at"], r["last_polled_at"], r["created_at"])
+        for r in rows
+    }
+
+
+async def save_fb_page_schedule(
+    pg_pool, rows: List[Tuple[str, int, datetime]]
+) -> None:
+    """Ghi (page_id, interval_seconds, next_poll_at) cho nhiều page."""
+    async with pg_pool.acquire() as con:
+        await con.executemany(
+            """
+            INSERT INTO fb_page_schedule (page_id, interval_seconds, next_poll_at)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (page_id) DO UPDATE SET
+                interval_seconds = EXCLUDED.interval_seconds,
+                next_poll_at     = EXCLUDED.next_poll_at;
+            """,
+            rows,
+        )
+
+
+async def mark_fb_page_polled(
+    pg_pool, page_id: str, polled_at: datetime, retry_at: Optional[datetime] = None
+) -> None:
+    """
+    Ghi nhận kết quả một lần poll: thành công → last_polled_at = polled_at;
+    thất bại (retry_at) → giữ last_polled_at, poll lại từ retry_at.
+    """
+    async with pg_pool.acquire() as con:
+        if retry_at is None:
+            await con.execute(
+                "UPDATE fb_page_schedule SET last_polled_at = $2 WHERE page_id = $1;",
+                page_id,
+                polled_at,
+            )
+        else:
+            await con.execute(
+                "UPDATE fb_page_schedule SET next_poll_at = $2 WHERE page_id = $1;",
+                page_id,
+                retry_at,
+            )
+
+
+# ── NOTIFICATION OUTBOX ─────────────────────────────────────────────────────────
+async def init_outbox_table(pg_pool) -> None:
+    """
+    Tạo bảng notification_outbox: thông báo Telegram chờ gửi, được ghi cùng
+    transaction với dữ liệu sinh ra nó và được delivery worker gửi sau.
+    """
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id               BIGSERIAL   PRIMARY KEY,
+                kind             TEXT        NOT NULL,
+                ref              TEXT        NOT NULL,
+                chat_id          BIGINT      NOT NULL,
+                text             TEXT        NOT NULL,
+                parse_mode       TEXT        NOT NULL DEFAULT 'Markdown',
+                status           TEXT        NOT NULL DEFAULT 'pending',
+                attempts         INTEGER     NOT NULL DEFAULT 0,
+                next_attempt_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                last_error       TEXT,
+                message_id       BIGINT,
+                created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+                sent_at          TIMESTAMPTZ,
+                UNIQUE (kind, ref, chat_id)
+            );
+            """
+        )
+        await con.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox"
+            "(next_attempt_at, id) WHERE status = 'pending';"
+        )
+        await con.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_chat_pending ON notification_outbox"
+            "(chat_id, id) WHERE status = 'pending';"
+        )
+        await _migrate_groups_fb_coalesce(con)
+
+
+async def _insert_outbox_rows(con, rows: List[Tuple[str, str, int, str]]) -> None:
+    # (kind, ref, chat_id) là khoá idempotent: ghi lại cùng thông báo không gửi 2 lần.
+    # executemany giữ thứ tự → id tăng dần đúng thứ tự cần gửi
+    await con.executemany(
+        """
+        INSERT INTO notification_outbox (kind, ref, chat_id, text)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (kind, ref, chat_id) DO NOTHING;
+        """,
+        rows,
+    )
+
+
+async def _insert_outbox(con, kind: str, ref: str, items: List[Tuple[int, str]]) -> None:
+    await _insert_outbox_rows(con, [(kind, ref, chat_id, text) for chat_id, text in items])
+
+
+async def enqueue_notifications(
+    pg_pool, kind: str, ref: str, items: List[Tuple[int, str]]
+) -> None:
+    """Ghi các thông báo (chat_id, text) vào outbox trong một transaction."""
+    if not items:
+        return
+    async with pg_pool.acquire() as con, con.transaction():
+        await _insert_outbox(con, kind, ref, items)
+
+
+async def claim_notifications(pg_pool, limit: int, lease: float) -> List[asyncpg.Record]:
+    """
+    Nhận tối đa `limit` thông báo đến hạn bằng FOR UPDATE SKIP LOCKED, để
+    nhiều delivery worker chạy song song không nhận trùng. Thông báo được
+    "cho thuê" `lease` giây (dời next_attempt_at): worker chết thì thông báo
+    tự đến hạn lại.
+
+    Thông báo chỉ được nhận khi mọi thông báo pending cũ hơn của cùng chat
+    cũng nằm trong lô này, để giữ đúng thứ tự gửi trong từng chat.
+    """
+    async with pg_pool.acquire() as con:
+        return await con.fetch(
+            """
+            WITH cand AS (
+                SELECT id, chat_id
+                  FROM notification_outbox
+                 WHERE status = 'pending' AND next_attempt_at <= now()
+                 ORDER BY id
+                 LIMIT $1
+                   FOR UPDATE SKIP LOCKED
+            ), ready AS (
+                SELECT c.id
+                  FROM cand c
+                 WHERE NOT EXISTS (
+                        SELECT 1
+                          FROM notification_outbox e
+                         WHERE e.chat_id = c.chat_id
+                           AND e.status = 'pending'
+                           AND e.id < c.id
+                           AND e.id NOT IN (SELECT id FROM cand)
+                 )
+            )
+            UPDATE notification_outbox o
+               SET attempts        = o.attempts + 1,
+                   next_attempt_at = now() + make_interval(secs => $2)
+              FROM ready
+             WHERE o.id = ready.id
+            RETURNING o.id, o.kind, o.chat_id, o.text, o.parse_mode, o.attempts;
+            """,
+            limit,
+            lease,
+        )
+
+
+async def extend_notification_lease(pg_pool, ids: List[int], lease: float) -> None:
+    """Gia hạn lease của các thông báo vẫn đang được gửi (chưa có kết quả)."""
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            UPDATE notification_outbox
+               SET next_attempt_at = now() + make_interval(secs => $2)
+             WHERE id = ANY($1::bigint[]) AND status = 'pending';
+            """,
+            ids,
+            lease,
+        )
+
+
+async def mark_notifications_sent(
+    pg_pool, ids: List[int], message_id: Optional[int] = None
+) -> None:
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            UPDATE notification_outbox
+               SET status = 'sent', sent_at = now(), message_id = $2, last_error = NULL
+             WHERE id = ANY($1::bigint[]);
+            """,
+            ids,
+            message_id,
+        )
+
+
+async def mark_notifications_retry(
+    pg_pool, ids: List[int], error: str, delay: float
+) -> None:
+    """Gửi lỗi tạm thời: thử lại sau `delay` giây."""
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            UPDATE notification_outbox
+               SET next_attempt_at = now() + make_interval(secs => $3), last_error = $2
+             WHERE id = ANY($1::bigint[]);
+            """,
+            ids,
+            error,
+            delay,
+        )
+
+
+async def mark_notifications_failed(pg_pool, ids: List[int], error: str) -> None:
+    """Gửi lỗi vĩnh viễn hoặc hết số lần thử: không gửi lại nữa."""
+    async with pg_pool.acquire() as con:
+        await con.execute(
+            """
+            UPDATE notification_outbox
+               SET status = 'failed', last_error = $2
+             WHERE id = ANY($1::bigint[]);
+            """,
+            ids,
+            error,
+        )
@@ -30,3 +30,18 @@ async def import_seen_ids(shop_name: str, ids: list[str]):
     key = _key(shop_name)
     added = await redis.sadd(key, *ids)
     logger.info(f"[IMPORT] Shop {shop_name}: imported {len(ids)} IDs into {key} (added {added} new)")
+
+
+# ── CACHE shop_id ─────────────────────────────────────────────────────────────
+def _shop_id_key(shop_name: str) -> str:
+    return f"shop_id:{shop_name.strip().lower()}"
+
+
+async def get_cached_shop_id(shop_name: str) -> str | None:
+    """Trả về shop_id đã cache, "" nếu đã cache là không tìm thấy, None nếu chưa cache."""
+    return await redis.get(_shop_id_key(shop_name))
+
+
+async def set_cached_shop_id(shop_name: str, shop_id: str | None, ttl: int):
+    """Cache shop_id trong `ttl` giây; shop_id=None được lưu thành "" (negative cache)."""
+    await redis.set(_shop_id_key(shop_name), shop_id or "", ex=ttl)
@@ -0,0 +1,34 @@
+from datetime import date
+from typing import List, Tuple
+
+from db.postgres import get_daily_report_rows
+
+SHOP_LINK = "https://dakuho.com/topics/{chat_id}/shops/{shop_id}"
+
+
+def render_daily_report(
+    chat_id: int, label: str, shops: List[Tuple[str, int, int]]
+) -> str:
+    """Dựng nội dung daily report (Markdown) cho một group."""
+    lines = [
+        f"• {name}: {cnt} new "
+        f"[Xem thêm]({SHOP_LINK.format(chat_id=chat_id, shop_id=sid)})"
+        for name, sid, cnt in shops
+    ]
+    return f"📊 *Daily Report {label}*\n\n" + (
+        "\n".join(lines) if lines else "No subscriptions."
+    )
+
+
+async def build_daily_reports(pg_pool, day: date) -> List[Tuple[int, str]]:
+    """
+    Dựng daily report cho mọi group từ một query tổng hợp duy nhất.
+
+    Returns:
+        Danh sách (chat_id, text) sẵn sàng để gửi.
+    """
+    label = day.isoformat()
+    return [
+        (chat_id, render_daily_report(chat_id, label, shops))
+        for chat_id, shops in await get_daily_report_rows(pg_pool, day)
+    ]
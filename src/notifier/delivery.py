@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+from notifier.telegram_client import send_message
+
+logger = logging.getLogger(__name__)
+
+# Lỗi không thể thành công khi gửi lại (bot bị kick, chat không tồn tại, ...)
+PERMANENT_ERRORS = {400, 401, 403, 404}
+
+
+@dataclass
+class DeliveryResult:
+    """Kết quả gửi một message, trả về cho nơi gọi."""
+
+    chat_id: int
+    ok: bool
+    attempts: int
+    error: Optional[str] = None
+    message_id: Optional[int] = None
+    # Lỗi tạm thời (hết số lần thử), có thể gửi lại sau; False với lỗi vĩnh viễn
+    retryable: bool = False
+
+
+@dataclass
+class _Outgoing:
+    text: str
+    parse_mode: str
+    future: asyncio.Future
+    attempts: int = 0
+    throttled: int = 0  # số lần bị 429, không tính vào max_attempts
+
+
+class _ChatState:
+    """Hàng đợi và lịch sử gửi của một chat."""
+
+    def __init__(self):
+        self.queue: Deque[_Outgoing] = deque()
+        self.next_at = 0.0  # thời điểm sớm nhất được gửi message kế tiếp
+        self.sent_at: Deque[float] = deque()  # thời điểm gửi trong 60s gần nhất
+        self.task: Optional[asyncio.Task] = None
+
+
+class DeliveryScheduler:
+    """
+    Lập lịch gửi Telegram theo giới hạn của Bot API.
+
+    - Toàn bot: rate limiter dùng chung của api.telegram.org (trong send_message).
+    - Mỗi chat: một hàng đợi riêng, cách nhau ít nhất `chat_interval` giây,
+      group (chat_id < 0) thêm giới hạn `group_per_minute` message/phút.
+    - 429: chat tạm dừng đúng `retry_after` giây rồi gửi lại chính message đó,
+      thứ tự trong chat được giữ nguyên. 5xx / lỗi mạng: backoff rồi gửi lại.
+
+    Các chat khác nhau được gửi song song, nên thông lượng chỉ bị chặn bởi
+    giới hạn toàn bot thay vì tổng thời gian chờ của từng chat.
+    """
+
+    def __init__(
+        self,
+        chat_interval: float,
+        group_per_minute: int,
+        max_attempts: int,
+    ):
+        self.chat_interval = chat_interval
+        self.group_per_minute = group_per_minute
+        self.max_attempts = max_attempts
+        # Giữ state cả khi hàng đợi rỗng để lần gửi sau vẫn tôn trọng giới hạn
+        self._chats: Dict[int, _ChatState] = {}
+
+    def submit(
+        self, chat_id: int, text: str, parse_mode: str = "Markdown"
+    ) -> "asyncio.Future[DeliveryResult]":
+        """Xếp message vào hàng đợi của chat, trả về future nhận DeliveryResult."""
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+        future = asyncio.get_running_loop().create_future()
+        state.queue.append(_Outgoing(text, parse_mode, future))
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._drain(chat_id, state))
+        return future
+
+    async def send(
+        self, chat_id: int, text: str, parse_mode: str = "Markdown"
+    ) -> DeliveryResult:
+        return await self.submit(chat_id, text, parse_mode)
+
+    async def send_all(
+        self, messages: Iterable[Tuple[int, str]], parse_mode: str = "Markdown"
+    ) -> List[DeliveryResult]:
+        """Gửi nhiều (chat_id, text), chờ tới khi tất cả có kết quả (cùng thứ tự)."""
+        futures = [self.submit(chat_id, text, parse_mode) for chat_id, text in messages]
+        return list(await asyncio.gather(*futures))
+
+    def _wait_time(self, chat_id: int, state: _ChatState, now: float) -> float:
+        wait = state.next_at - now
+        if chat_id < 0:
+            while state.sent_at and state.sent_at[0] <= now - 60:
+                state.sent_at.popleft()
+            if len(state.sent_at) >= self.group_per_minute:
+                wait = max(wait, state.sent_at[0] + 60 - now)
+        return wait
+
+    async def _drain(self, chat_id: int, state: _ChatState) -> None:
+        while state.queue:
+            wait = self._wait_time(chat_id, state, time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            item = state.queue[0]
+            item.attempts += 1
+            now = time.monotonic()
+            state.next_at = now + self.chat_interval
+            state.sent_at.append(now)
+            retry_in, error, message_id = await self._attempt(chat_id, item)
+
+            failures = item.attempts - item.throttled
+            if error is None or retry_in is None or failures >= self.max_attempts:
+                state.queue.popleft()
+                if error is not None:
+                    logger.error(
+                        f"[TG] Delivery to {chat_id} failed after "
+                        f"{item.attempts} attempts: {error}"
+                    )
+                if not item.future.done():
+                    item.future.set_result(
+                        DeliveryResult(
+                            chat_id,
+                            error is None,
+                            item.attempts,
+                            error,
+                            message_id,
+                            retryable=error is not None and retry_in is not None,
+                        )
+                    )
+                continue
+
+            logger.warning(
+                f"[TG] Chat {chat_id}: {error}, retry "
+                f"{failures}/{self.max_attempts} in {retry_in:.1f}s"
+            )
+            state.next_at = max(state.next_at, time.monotonic() + retry_in)
+
+    async def _attempt(
+        self, chat_id: int, item: _Outgoing
+    ) -> Tuple[Optional[float], Optional[str], Optional[int]]:
+        """
+        Gửi một lần. Returns: (retry_in, error, message_id); retry_in=None
+        nghĩa là không gửi lại (thành công hoặc lỗi vĩnh viễn).
+        """
+        try:
+            resp = await send_message(chat_id, item.text, item.parse_mode)
+        except Exception as e:
+            return min(2.0**item.attempts, 60.0), f"{type(e).__name__}: {e}", None
+
+        if resp.get("ok"):
+            return None, None, (resp.get("result") or {}).get("message_id")
+
+        code = resp.get("error_code") or 0
+        error = f"{code} {resp.get('description', '')}".strip()
+        if code == 429:
+            # Bị throttle không phải lỗi của message: chờ và gửi lại tới khi được
+            item.throttled += 1
+            params = resp.get("parameters") or {}
+            return float(params.get("retry_after") or 1), error, None
+        if code in PERMANENT_ERRORS:
+            return None, error, None
+        return min(2.0**item.attempts, 60.0), error, None
+
+
+_scheduler: Optional[DeliveryScheduler] = None
+
+
+def get_delivery_scheduler() -> DeliveryScheduler:
+    """Delivery scheduler dùng chung của process."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DeliveryScheduler(
+            chat_interval=settings.TELEGRAM_CHAT_INTERVAL,
+            group_per_minute=settings.TELEGRAM_GROUP_PER_MINUTE,
+            max_attempts=settings.TELEGRAM_MAX_ATTEMPTS,
+        )
+    return _scheduler
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from config.settings import settings
+from db.postgres import (
+    claim_notifications,
+    extend_notification_lease,
+    get_fb_coalesce_settings,
+    init_outbox_table,
+    mark_notifications_failed,
+    mark_notifications_retry,
+    mark_notifications_sent,
+)
+from notifier.delivery import get_delivery_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Giới hạn độ dài một message Telegram, và phân cách giữa các bài khi gộp
+TELEGRAM_MAX_LENGTH = 4096
+FB_DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+# Đánh thức delivery worker trong process khi vừa có thông báo mới
+_wake = asyncio.Event()
+
+
+def wake_outbox_worker() -> None:
+    """Báo có thông báo mới để worker trong process gửi ngay, không chờ poll."""
+    _wake.set()
+
+
+def _telegram_len(text: str) -> int:
+    """Độ dài theo cách Telegram đếm (UTF-16 code unit, emoji tính 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _coalesce_messages(
+    texts: List[str], limit: int = TELEGRAM_MAX_LENGTH
+) -> List[Tuple[str, int]]:
+    """
+    Gộp các message liên tiếp thành ít message nhất, mỗi message ≤ `limit` ký tự,
+    giữ nguyên thứ tự. Message đơn đã dài hơn limit được gửi riêng như cũ.
+
+    Returns:
+        Danh sách (message đã gộp, số message gốc trong đó).
+    """
+    packed: List[Tuple[str, int]] = []
+    current, count = "", 0
+    for text in texts:
+        candidate = f"{current}{FB_DIGEST_SEPARATOR}{text}" if count else text
+        if count and _telegram_len(candidate) > limit:
+            packed.append((current, count))
+            current, count = text, 1
+        else:
+            current, count = candidate, count + 1
+    if count:
+        packed.append((current, count))
+    return packed
+
+
+def _build_messages(
+    rows, coalesce: Dict[int, bool]
+) -> List[Tuple[int, str, str, List[int]]]:
+    """
+    Chia lô thông báo thành các message cần gửi theo thứ tự ghi outbox:
+    (chat_id, parse_mode, text, [outbox id]). Các bài Facebook liên tiếp
+    của một chat bật fb_coalesce được gộp lại.
+    """
+    by_chat: Dict[Tuple[int, str], List] = {}
+    for r in sorted(rows, key=lambda r: r["id"]):
+        by_chat.setdefault((r["chat_id"], r["parse_mode"]), []).append(r)
+
+    messages = []
+    for (chat_id, parse_mode), items in by_chat.items():
+        if not coalesce.get(chat_id, settings.FB_COALESCE):
+            messages.extend((chat_id, parse_mode, r["text"], [r["id"]]) for r in items)
+            continue
+        i = 0
+        while i < len(items):
+            if items[i]["kind"] != "fb_post":
+                messages.append((chat_id, parse_mode, items[i]["text"], [items[i]["id"]]))
+                i += 1
+                continue
+            run = []
+            while i < len(items) and items[i]["kind"] == "fb_post":
+                run.append(items[i])
+                i += 1
+            start = 0
+            for text, n in _coalesce_messages([r["text"] for r in run]):
+                ids = [r["id"] for r in run[start : start + n]]
+                messages.append((chat_id, parse_mode, text, ids))
+                start += n
+    return messages
+
+
+async def deliver_batch(pg_pool) -> int:
+    """
+    Nhận một lô thông báo từ outbox, gửi qua delivery scheduler và ghi lại
+    trạng thái. Returns: số thông báo đã nhận (0 nếu outbox không có gì đến hạn).
+    """
+    rows = await claim_notifications(
+        pg_pool, settings.OUTBOX_BATCH_SIZE, settings.OUTBOX_LEASE_SECONDS
+    )
+    if not rows:
+        return 0
+
+    attempts = {r["id"]: r["attempts"] for r in rows}
+    messages = _build_messages(rows, await get_fb_coalesce_settings(pg_pool))
+    scheduler = get_delivery_scheduler()
+    futures = [
+        scheduler.submit(chat_id, text, parse_mode)
+        for chat_id, parse_mode, text, _ in messages
+    ]
+
+    # Lô lớn tới một chat có thể gửi lâu hơn lease (20 message/phút mỗi group):
+    # gia hạn định kỳ để worker khác không nhận lại thông báo đang gửi
+    async def _heartbeat() -> None:
+        lease = settings.OUTBOX_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                await extend_notification_lease(pg_pool, list(attempts), lease)
+            except Exception as e:
+                logger.warning(f"[OUTBOX] Lease renewal failed: {e}")
+
+    heartbeat = asyncio.create_task(_heartbeat())
+    try:
+        results = await asyncio.gather(*futures)
+    finally:
+        heartbeat.cancel()
+
+    sent = failed = 0
+    for (chat_id, _, _, ids), result in zip(messages, results):
+        if result.ok:
+            await mark_notifications_sent(pg_pool, ids, result.message_id)
+            sent += len(ids)
+            continue
+        n = max(attempts[i] for i in ids)
+        if result.retryable and n < settings.OUTBOX_MAX_ATTEMPTS:
+            delay = min(30.0 * 2 ** (n - 1), 3600.0)
+            await mark_notifications_retry(pg_pool, ids, result.error, delay)
+            logger.warning(
+                f"[OUTBOX] Chat {chat_id}: {result.error}, "
+                f"retry {n}/{settings.OUTBOX_MAX_ATTEMPTS} in {delay:.0f}s"
+            )
+        else:
+            await mark_notifications_failed(pg_pool, ids, result.error)
+            failed += len(ids)
+            logger.error(f"[OUTBOX] Chat {chat_id}: giving up: {result.error}")
+
+    logger.info(
+        f"[OUTBOX] Batch of {len(rows)} notifications in {len(messages)} messages: "
+        f"{sent} sent, {failed} failed"
+    )
+    return len(rows)
+
+
+async def run_outbox_worker(pg_pool, stop: asyncio.Event) -> None:
+    """
+    Delivery worker: chạy OUTBOX_CONCURRENCY vòng nhận lô → gửi cho tới khi
+    `stop` được set. Nhiều process có thể chạy cùng lúc (SKIP LOCKED).
+    """
+    await init_outbox_table(pg_pool)
+
+    async def _loop() -> None:
+        while not stop.is_set():
+            try:
+                claimed = await deliver_batch(pg_pool)
+            except Exception as e:
+                logger.error(f"[OUTBOX] Delivery error: {e}")
+                claimed = 0
+            if not claimed:
+                try:
+                    await asyncio.wait_for(
+                        _wake.wait(), timeout=settings.OUTBOX_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                _wake.clear()
+
+    logger.info(
+        f"[OUTBOX] Delivery worker started "
+        f"({settings.OUTBOX_CONCURRENCY} loops, batch={settings.OUTBOX_BATCH_SIZE})"
+    )
+    await asyncio.gather(*(_loop() for _ in range(settings.OUTBOX_CONCURRENCY)))
@@ -1,11 +1,17 @@
-import aiohttp
+from api.http_client import get_session
+from api.json_codec import read_json
+from api.rate_limiter import get_rate_limiter, parse_retry_after
 from config.settings import settings
 
 BASE_URL = f"https://api.telegram.org/bot{settings.BOT_TOKEN}"
 
-async def send_message(chat_id: int, text: str, parse_mode: str = "Markdown"):
+async def send_message(chat_id: int, text: str, parse_mode: str = "Markdown") -> dict:
     """
     Gửi 1 message đơn, dùng cho daily summary và mọi trường hợp khác.
+
+    Returns:
+        Response của Bot API ({"ok": ..., "error_code": ..., "parameters": ...}).
+        Body không phải JSON được quy về {"ok": False, "error_code": status}.
     """
     payload = {
         "chat_id": chat_id,
@@ -13,5 +19,16 @@ async def send_message(chat_id: int, text: str, parse_mode: str = "Markdown"):
         "parse_mode": parse_mode,
         "disable_web_page_preview": False,
     }
-    async with aiohttp.ClientSession() as session:
-        await session.post(f"{BASE_URL}/sendMessage", json=payload)
+    session = get_session("telegram")
+    limiter = get_rate_limiter(BASE_URL)
+    await limiter.acquire()
+    async with session.post(f"{BASE_URL}/sendMessage", json=payload) as resp:
+        limiter.on_response(resp.status, parse_retry_after(resp.headers))
+        try:
+            data = await read_json(resp)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            body = await resp.text()
+            return {"ok": False, "error_code": resp.status, "description": body[:200]}
+        return data
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from api.circuit_breaker import UpstreamUnavailable
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ShopWorker = Callable[[str, int], Awaitable[int]]
+
+
+class HostLimiter:
+    """
+    Giới hạn số request đồng thời tới cùng một upstream host.
+    Mỗi host có một semaphore riêng, tạo lười khi gặp lần đầu.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.limit)
+        return sem
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Giữ một slot của host tương ứng với url trong suốt block `async with`."""
+        host = urlsplit(url).hostname or ""
+        async with self._semaphore(host):
+            yield
+
+
+# Dùng chung cho mọi request HTTP của poller
+host_limits = HostLimiter(settings.COLLECT_PER_HOST_LIMIT)
+
+
+@dataclass
+class CollectionSummary:
+    """Kết quả tổng hợp của một lượt thu thập."""
+
+    total: int = 0
+    succeeded: Dict[str, int] = field(default_factory=dict)  # shop_name → số listing mới
+    failed: Dict[str, str] = field(default_factory=dict)  # shop_name → lỗi
+    # shop_name → shop_id bị bỏ qua vì upstream unavailable, cần thử lại
+    unavailable: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def log(self) -> None:
+        logger.info(
+            f"[COLLECT] Done {self.total} shops in {self.elapsed:.1f}s: "
+            f"{len(self.succeeded)} ok, {len(self.failed)} failed, "
+            f"{len(self.unavailable)} skipped (upstream unavailable), "
+            f"{sum(self.succeeded.values())} new listings"
+        )
+        for name, err in sorted(self.failed.items()):
+            logger.warning(f"[COLLECT] {name} failed: {err}")
+
+
+async def run_collection(
+    shops: Iterable[Tuple[str, int]],
+    worker: ShopWorker,
+    *,
+    concurrency: Optional[int] = None,
+    shop_timeout: Optional[float] = None,
+) -> CollectionSummary:
+    """
+    Chạy `worker(shop_name, shop_id)` cho mọi shop bằng một worker pool cố định.
+
+    Args:
+        shops: Danh sách (shop_name, shop_id) cần thu thập.
+        worker: Coroutine thu thập một shop, trả về số listing mới.
+        concurrency: Số shop chạy song song (mặc định COLLECT_CONCURRENCY).
+        shop_timeout: Thời gian tối đa cho mỗi shop (mặc định COLLECT_SHOP_TIMEOUT).
+
+    Returns:
+        CollectionSummary với kết quả từng shop.
+    """
+    concurrency = concurrency or settings.COLLECT_CONCURRENCY
+    shop_timeout = shop_timeout or settings.COLLECT_SHOP_TIMEOUT
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for shop in shops:
+        queue.put_nowait(shop)
+
+    summary = CollectionSummary(total=queue.qsize())
+    started = time.monotonic()
+
+    async def _worker_loop():
+        while True:
+            try:
+                name, sid = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                cnt = await asyncio.wait_for(worker(name, sid), timeout=shop_timeout)
+                summary.succeeded[name] = cnt
+            except UpstreamUnavailable:
+                # Circuit mở: các shop còn lại cũng fail ngay, đánh dấu để thử lại
+                summary.unavailable[name] = sid
+            except asyncio.TimeoutError:
+                summary.failed[name] = f"timeout after {shop_timeout:.0f}s"
+            except Exception as e:
+                summary.failed[name] = f"{type(e).__name__}: {e}"
+
+    n_workers = min(concurrency, summary.total)
+    logger.info(
+        f"[COLLECT] Collecting {summary.total} shops with {n_workers} workers "
+        f"(per-host limit={host_limits.limit}, timeout={shop_timeout:.0f}s)"
+    )
+    await asyncio.gather(*(_worker_loop() for _ in range(n_workers)))
+
+    summary.elapsed = time.monotonic() - started
+    summary.log()
+    return summary
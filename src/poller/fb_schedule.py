@@ -0,0 +1,146 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping
+
+from config.settings import settings
+from db.postgres import (
+    get_fb_page_schedule,
+    get_fb_post_counts,
+    save_fb_page_schedule,
+    try_advisory_lock,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mức mặc định trước khi có lịch sử: poll 6h/lần như lịch cron cũ
+LEGACY_INTERVAL = 6 * 3600
+# Lịch sử giả định (ngày) ở mức LEGACY_INTERVAL, làm mượt ước lượng của page mới
+PRIOR_DAYS = 1.0
+# Advisory lock của claim_due_fb_pages: mỗi lúc chỉ một process nhận page
+FB_SCHEDULE_LOCK_KEY = 0x46425343  # "FBSC"
+
+
+def daily_credit_budget(n_pages: int) -> float:
+    """Ngân sách credits/ngày; mặc định bằng chi phí poll mọi page 6h/lần."""
+    if settings.FB_DAILY_CREDIT_BUDGET > 0:
+        return float(settings.FB_DAILY_CREDIT_BUDGET)
+    return n_pages * (86400 / LEGACY_INTERVAL) * settings.FB_CREDITS_PER_POLL
+
+
+def plan_poll_intervals(
+    page_days: Mapping[str, float],
+    post_counts: Mapping[str, int],
+    budget: float,
+) -> Dict[str, int]:
+    """
+    Tính interval poll (giây) cho từng page.
+
+    Tần suất đăng = (số bài trong lịch sử + prior) / (số ngày theo dõi + PRIOR_DAYS),
+    prior tương ứng PRIOR_DAYS ngày ở mức poll 6h/lần nên page mới bắt đầu từ
+    6h rồi dần theo lịch sử thật. Interval = FB_TARGET_POSTS_PER_POLL / tần suất,
+    kẹp trong [FB_POLL_MIN_INTERVAL, FB_POLL_MAX_INTERVAL]. Tổng credits/ngày
+    vượt `budget` → giãn đều interval các page chưa chạm max cho tới khi vừa.
+
+    Args:
+        page_days: page_id → số ngày lịch sử đã theo dõi page.
+        post_counts: page_id → số bài trong khoảng lịch sử đó.
+    """
+    lo, hi = settings.FB_POLL_MIN_INTERVAL, settings.FB_POLL_MAX_INTERVAL
+    target = settings.FB_TARGET_POSTS_PER_POLL
+    prior_posts = target * PRIOR_DAYS * 86400 / LEGACY_INTERVAL
+
+    intervals: Dict[str, float] = {}
+    for page_id, days in page_days.items():
+        per_day = (post_counts.get(page_id, 0) + prior_posts) / (days + PRIOR_DAYS)
+        intervals[page_id] = min(max(target * 86400 / per_day, lo), hi)
+
+    def _cost(iv: float) -> float:
+        return 86400 / iv * settings.FB_CREDITS_PER_POLL
+
+    # Mỗi vòng giãn các page còn dưới max; page chạm max giữ cố định
+    for _ in range(10):
+        fixed = sum(_cost(iv) for iv in intervals.values() if iv >= hi)
+        free = sum(_cost(iv) for iv in intervals.values() if iv < hi)
+        if fixed + free <= budget or free == 0:
+            break
+        if budget <= fixed:
+            intervals = dict.fromkeys(intervals, hi)
+            break
+        factor = free / (budget - fixed)
+        intervals = {
+            pid: min(iv * factor, hi) if iv < hi else iv
+            for pid, iv in intervals.items()
+        }
+
+    total = sum(_cost(iv) for iv in intervals.values())
+    if total > budget * 1.001:
+        logger.warning(
+            f"[FB] Credit budget {budget:.0f}/day is below the cost of polling "
+            f"every page at FB_POLL_MAX_INTERVAL (~{total:.0f}/day)"
+        )
+    # Làm tròn lên để tổng credits không vượt ngân sách
+    return {pid: math.ceil(iv) for pid, iv in intervals.items()}
+
+
+async def claim_due_fb_pages(
+    pg, page_ids: Iterable[str], now: datetime
+) -> List[str]:
+    """
+    Cập nhật lịch poll của các page đang được theo dõi và nhận các page đã tới hạn.
+    Page được nhận dời next_poll_at sang lần kế tiếp ngay. Cả lượt đọc → ghi
+    chạy dưới advisory lock, nên coordinator khác (hoặc tick chồng lên) không
+    nhận trùng: process không lấy được lock bỏ qua tick này.
+
+    Returns:
+        Danh sách page_id tới hạn poll.
+    """
+    async with try_advisory_lock(pg, FB_SCHEDULE_LOCK_KEY) as locked:
+        if not locked:
+            logger.debug("[FB] Schedule is being claimed by another process")
+            return []
+        return await _claim_due_fb_pages(pg, list(page_ids), now)
+
+
+async def _claim_due_fb_pages(pg, page_ids: List[str], now: datetime) -> List[str]:
+    history_days = settings.FB_RATE_HISTORY_DAYS
+    schedule = await get_fb_page_schedule(pg)
+    counts = await get_fb_post_counts(pg, now - timedelta(days=history_days))
+
+    # Page mới theo dõi chỉ có lịch sử từ lúc vào lịch; get_fb_post_counts
+    # cũng chỉ đếm bài từ lúc đó, nên số bài và số ngày cùng một khoảng
+    page_days: Dict[str, float] = {}
+    for page_id in page_ids:
+        entry = schedule.get(page_id)
+        days = float(history_days)
+        if entry is not None:
+            days = min(days, (now - entry[2]).total_seconds() / 86400)
+        page_days[page_id] = max(days, 0.0)
+    intervals = plan_poll_intervals(
+        page_days, counts, daily_credit_budget(len(page_ids))
+    )
+
+    due: List[str] = []
+    rows = []
+    for page_id in page_ids:
+        interval = intervals[page_id]
+        entry = schedule.get(page_id)
+        next_at: datetime = now
+        if entry is not None:
+            next_at, last = entry[0], entry[1]
+            # Interval ngắn lại (page đăng nhiều hơn) → có hiệu lực ngay
+            if last is not None:
+                next_at = min(next_at, last + timedelta(seconds=interval))
+        if next_at <= now:
+            due.append(page_id)
+            next_at = now + timedelta(seconds=interval)
+        rows.append((page_id, interval, next_at))
+    await save_fb_page_schedule(pg, rows)
+
+    if intervals:
+        spend = sum(86400 / iv for iv in intervals.values())
+        logger.debug(
+            f"[FB] Schedule: {len(due)}/{len(page_ids)} pages due, "
+            f"~{spend * settings.FB_CREDITS_PER_POLL:.0f} credits/day planned"
+        )
+    return due
@@ -1,8 +1,13 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator
+import math
 import sys
 import random
+import signal
+from collections import deque
 
 import aiohttp
 import pytz
@@ -11,15 +16,32 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from config.settings import settings
 from db.postgres import (
     init_pg_pool,
-    get_all_group_ids,
-    get_shops_for_group,
+    get_subscribed_shops,
     ensure_seen_table,
+    init_listings_tables,
+    migrate_legacy_listing_tables,
+    get_shop_watermark,
+    bulk_upsert_listings,
     init_fb_tables,
     get_all_fb_page_subscriptions,
-    save_fb_post,
+    bulk_save_fb_posts,
+    advance_fb_page_cursor,
+    get_fb_page_cursors,
+    mark_fb_page_polled,
+    init_outbox_table,
+    enqueue_notifications,
 )
-from api.client import fetch_fb_posts, create_toolvn_session
-from notifier.telegram_client import send_message
+from api.circuit_breaker import get_circuit_breaker
+from api.client import fetch_fb_posts
+from api.http_client import close_sessions, get_session
+from api.json_codec import read_json
+from api.proxy_pool import PROXY_BLOCK_STATUSES, get_proxy_pool
+from api.rate_limiter import get_rate_limiter, parse_retry_after
+from notifier.daily_report import build_daily_reports
+from notifier.outbox import run_outbox_worker, wake_outbox_worker
+from poller.engine import host_limits, run_collection
+from poller.fb_schedule import claim_due_fb_pages
+from poller.work_queue import Task, WorkQueue, run_worker
 
 # Setup logging
 logging.basicConfig(
@@ -34,7 +56,30 @@ TZ = pytz.timezone("Asia/Bangkok")
 API_BASE = "https://service.sidcorp.co/api/v3/etsy"
 API_KEY = settings.API_KEY
 
-daily_counts: dict[str, int] = {}
+# Page chưa có cursor (mới theo dõi): chỉ coi bài trong 6h gần nhất là bài mới
+FB_INITIAL_WINDOW = timedelta(hours=6)
+
+# Pool PostgreSQL dùng chung của process: các job chạy định kỳ (FB tick mỗi
+# vài phút) dùng lại pool thay vì mỗi lần tạo một pool mới không bao giờ đóng
+_pg_pool = None
+_pg_pool_lock = asyncio.Lock()
+
+
+async def get_pg_pool():
+    """Pool PostgreSQL dùng chung, tạo ở lần gọi đầu tiên."""
+    global _pg_pool
+    async with _pg_pool_lock:
+        if _pg_pool is None:
+            _pg_pool = await init_pg_pool()
+    return _pg_pool
+
+
+async def close_pg_pool() -> None:
+    global _pg_pool
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
+
 
 # Transient statuses - lỗi tạm thời cần retry
 TRANSIENT_STATUSES = {429, 500, 502, 503, 504, 522, 523, 524}
@@ -52,28 +97,53 @@ async def get_with_retries(
     """
     GET request với retry logic cho lỗi tạm thời.
     Trả về (status, data, is_json).
+
+    Raises:
+        UpstreamUnavailable: circuit breaker của host đang mở.
     """
     backoff = base_backoff
     last_error = None
+    proxy_pool = get_proxy_pool()
+    # Rate limiter dùng chung cho mọi coroutine gọi cùng host
+    limiter = get_rate_limiter(url)
+    breaker = get_circuit_breaker(url)
 
     for attempt in range(1, max_attempts + 1):
+        retry_after = None
+        # Circuit mở → fail ngay, không tốn thêm attempt/backoff
+        breaker.check()
         try:
-            resp = await sess.get(
-                url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)
-            )
-            status = resp.status
-            ctype = (resp.headers.get("Content-Type") or "").lower()
-            is_json = "application/json" in ctype
-
-            if is_json:
-                try:
-                    data = await resp.json()
-                except Exception:
-                    # Server trả HTML nhưng header ghi json
+            await limiter.acquire()
+            # Giới hạn số request đồng thời tới cùng host, đi qua proxy pool
+            async with host_limits.slot(url), proxy_pool.use() as lease, sess.get(
+                url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                proxy=lease.url,
+                proxy_auth=lease.auth,
+            ) as resp:
+                status = resp.status
+                if status in PROXY_BLOCK_STATUSES:
+                    lease.fail()
+                retry_after = parse_retry_after(resp.headers)
+                limiter.on_response(status, retry_after)
+                ctype = (resp.headers.get("Content-Type") or "").lower()
+                is_json = "application/json" in ctype
+
+                if is_json:
+                    try:
+                        data = await read_json(resp)
+                    except Exception:
+                        # Server trả HTML nhưng header ghi json
+                        data = await resp.text()
+                        is_json = False
+                else:
                     data = await resp.text()
-                    is_json = False
+
+            if status >= 500:
+                breaker.record_failure()
             else:
-                data = await resp.text()
+                breaker.record_success()
 
             # Thành công hoặc lỗi không-transient → trả về
             if status < 400 or status not in TRANSIENT_STATUSES:
@@ -86,13 +156,26 @@ async def get_with_retries(
                 f"waiting {backoff:.1f}s..."
             )
 
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
         except asyncio.TimeoutError as e:
+            breaker.record_failure()
             last_error = f"Timeout: {e}"
             logger.warning(
                 f"[Retry {attempt}/{max_attempts}] {url} timeout, "
                 f"waiting {backoff:.1f}s..."
             )
+        except aiohttp.ClientProxyConnectionError as e:
+            # Lỗi của proxy, không phải của upstream
+            breaker.release()
+            last_error = str(e)
+            logger.warning(
+                f"[Retry {attempt}/{max_attempts}] {url} proxy error: {e}, "
+                f"waiting {backoff:.1f}s..."
+            )
         except Exception as e:
+            breaker.record_failure()
             last_error = str(e)
             logger.warning(
                 f"[Retry {attempt}/{max_attempts}] {url} error: {e}, "
@@ -100,8 +183,10 @@ async def get_with_retries(
             )
 
         if attempt < max_attempts:
-            # Exponential backoff + jitter
-            await asyncio.sleep(backoff + random.uniform(0, 0.5))
+            # Có Retry-After thì limiter đã chặn cả host, không cần chờ thêm
+            if retry_after is None:
+                # Exponential backoff + jitter
+                await asyncio.sleep(backoff + random.uniform(0, 0.5))
             backoff = min(backoff * 2, 10.0)
 
     # Hết retry attempts
@@ -111,221 +196,561 @@ async def get_with_retries(
     return 503, {"error": f"Max retries exceeded. Last error: {last_error}"}, True
 
 
-async def ensure_shop_table(pg, shop_id: int) -> str:
-    table = f"listing_{shop_id}"
-    # Drop and recreate table
-    await pg.execute(f'DROP TABLE IF EXISTS "{table}";')
-    await pg.execute(
-        f"""
-        CREATE TABLE "{table}" (
-            listing_id     TEXT PRIMARY KEY,
-            url            TEXT,
-            listing_images TEXT,
-            created_at     TIMESTAMPTZ
-        );
+def _extract_listing_images(img_data) -> dict:
+    """Lấy mapping listing_id → danh sách ảnh từ response /listing-images."""
+    listing_imgs = None
+    if "data" in img_data:
+        # New API format
+        data_dict = img_data.get("data")
+        if isinstance(data_dict, dict):
+            listing_imgs = data_dict.get("listing_images")
+    elif "results" in img_data:
+        results = img_data.get("results")
+        if isinstance(results, dict):
+            listing_imgs = results.get("listing_images")
+    if not isinstance(listing_imgs, dict):
+        return {}
+    return {str(k): v for k, v in listing_imgs.items()}
+
+
+async def fetch_listing_images(
+    sess: aiohttp.ClientSession,
+    shop_name: str,
+    listing_ids: list[str],
+    *,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> dict[str, str]:
+    """
+    Lấy URL ảnh đầu tiên (url_570xN) cho nhiều listing.
+
+    listing_ids được chia thành các batch `batch_size` id và gửi song song
+    tối đa `concurrency` batch. Nếu upstream từ chối một batch (4xx hoặc
+    response không hợp lệ), batch đó được chia đôi và thử lại cho tới khi
+    còn 1 id.
+
+    Returns:
+        dict listing_id → URL ảnh ("" nếu không có ảnh).
+    """
+    batch_size = max(1, batch_size or settings.IMAGE_BATCH_SIZE)
+    sem = asyncio.Semaphore(concurrency or settings.IMAGE_BATCH_CONCURRENCY)
+    images: dict[str, str] = {}
+    n_requests = 0
+
+    async def _fetch_chunk(chunk: list[str]) -> None:
+        nonlocal n_requests
+        async with sem:
+            n_requests += 1
+            status, data, is_json = await get_with_retries(
+                sess,
+                f"{API_BASE}/listing-images",
+                params={"listing_ids": ",".join(chunk)},
+            )
+
+        if status == 200 and is_json and isinstance(data, dict):
+            mapping = _extract_listing_images(data)
+            for lid in chunk:
+                imgs = mapping.get(lid)
+                if imgs and isinstance(imgs, list) and isinstance(imgs[0], dict):
+                    images[lid] = imgs[0].get("url_570xN", "") or ""
+            return
+
+        rejected = 400 <= status < 500 or (status == 200 and not is_json)
+        if rejected and len(chunk) > 1:
+            # Upstream từ chối batch → chia đôi và thử lại
+            mid = len(chunk) // 2
+            logger.info(
+                f"[{shop_name}] Images batch of {len(chunk)} rejected ({status}), "
+                f"splitting"
+            )
+            await asyncio.gather(_fetch_chunk(chunk[:mid]), _fetch_chunk(chunk[mid:]))
+            return
+
+        logger.warning(
+            f"[{shop_name}] Images API failed for {len(chunk)} listings: {status}"
+        )
+
+    chunks = [
+        listing_ids[i : i + batch_size] for i in range(0, len(listing_ids), batch_size)
+    ]
+    await asyncio.gather(*(_fetch_chunk(c) for c in chunks))
+    if listing_ids:
+        logger.info(
+            f"[{shop_name}] Images: {len(images)}/{len(listing_ids)} listings "
+            f"in {n_requests} requests"
+        )
+    return images
+
+
+def _pagination_info(metadata) -> tuple[bool, int | None]:
+    """Đọc (has_more, total) từ metadata của listings API."""
+    has_more = False
+    total = None
+    if isinstance(metadata, dict):
+        meta = metadata.get("pagination", {})
+        if isinstance(meta, dict):
+            has_more = meta.get("has_next", metadata.get("has_more", False))
+            raw_total = meta.get("total", meta.get("total_count"))
+            if isinstance(raw_total, int) and raw_total >= 0:
+                total = raw_total
+    return bool(has_more), total
+
+
+class IncompleteListingWalk(Exception):
+    """
+    Phân trang dừng trước khi tới cutoff / high-water mark và trước has_next=false
+    (page lỗi hoặc chạm max_pages): có thể còn listing mới chưa được duyệt.
+    """
+
+
+@dataclass
+class ListingPage:
+    """Một page listings đã lọc, yield bởi iter_listing_pages."""
+
+    number: int
+    # (listing_id, url, created_at) mới hơn cutoff và high-water mark
+    listings: list[tuple[str, str | None, datetime]]
+    # (created_at, listing_id) mới nhất trong page, dùng cho high-water mark
+    newest: tuple[datetime, str] | None
+
+
+async def _fetch_listings_page(
+    sess: aiohttp.ClientSession, shop_name: str, shop_id: int, offset: int, limit: int
+) -> tuple[list, dict] | None:
+    """GET một page listings, trả về (items, metadata) hoặc None nếu lỗi."""
+    params = {
+        "shop_id": shop_id,
+        "offset": offset,
+        "limit": limit,
+        "sort_by": "created",
+        "order": "desc",  # Mới nhất trước để tối ưu
+    }
+
+    # Sử dụng retry logic
+    status, data, is_json = await get_with_retries(
+        sess, f"{API_BASE}/listings", params=params
+    )
+
+    logger.info(f"[{shop_name}] GET listings (offset={offset}) -> {status}")
+
+    if status != 200:
+        error_msg = data if isinstance(data, str) else str(data)
+        logger.error(f"[{shop_name}] Listing API error {status}: {error_msg}")
+        return None
+
+    # Data phải là dict nếu is_json=True
+    if not is_json or not isinstance(data, dict):
+        logger.error(f"[{shop_name}] Invalid response format")
+        return None
+
+    # Handle new API format: data is in 'data' field, not 'results'
+    if "data" in data and isinstance(data["data"], list):
+        items = data["data"]  # New format
+    else:
+        items = data.get("results", []) or []  # Old format fallback
+    return items, data.get("metadata", {})
+
+
+def _parse_created(item) -> datetime | None:
+    """Đọc created_at (ISO 8601) của một listing, None nếu thiếu hoặc sai định dạng."""
+    created = item.get("created_at") if isinstance(item, dict) else None
+    if not created:
+        return None
+    return datetime.fromisoformat(created.replace("Z", "+00:00")).replace(
+        tzinfo=pytz.UTC
+    )
+
+
+def _estimate_extra_pages(items: list, boundary: datetime) -> int:
+    """
+    Ước lượng số page cần tải thêm sau page đầu: khoảng thời gian còn lại tới
+    boundary chia cho khoảng thời gian page đầu bao phủ.
+    """
+    try:
+        first, last = _parse_created(items[0]), _parse_created(items[-1])
+    except Exception:
+        return 0
+    if first is None or last is None or last < boundary:
+        return 0
+    span = (first - last).total_seconds()
+    if span <= 0:
+        return 0
+    return max(1, math.ceil((last - boundary).total_seconds() / span))
+
+
+async def _fan_out_pages(
+    sess: aiohttp.ClientSession,
+    shop_name: str,
+    shop_id: int,
+    offsets: list[int],
+    limit: int,
+) -> list[tuple[list, dict, int]]:
+    """
+    Tải song song nhiều page listings (qua limiter dùng chung trong get_with_retries),
+    gộp lại theo created desc rồi chia lại thành các page `limit` item.
+
+    Chỉ giữ các page liên tiếp trước page lỗi đầu tiên; phần còn lại sẽ được
+    phân trang tuần tự như bình thường.
+
+    Returns:
+        Danh sách (items, metadata, offset_kế_tiếp) theo thứ tự duyệt.
     """
+    results = await asyncio.gather(
+        *(_fetch_listings_page(sess, shop_name, shop_id, off, limit) for off in offsets)
     )
-    return table
+    fetched = []
+    for off, page in zip(offsets, results):
+        if page is None or not page[0]:
+            break
+        fetched.append((off, page))
+    if not fetched:
+        return []
+
+    # Listing mới chen vào trong lúc tải có thể làm trùng item giữa 2 page
+    merged = {}
+    for _, (items, _) in fetched:
+        for it in items:
+            if isinstance(it, dict):
+                merged.setdefault(str(it.get("listing_id")), it)
+
+    def _sort_key(it):
+        try:
+            dt = _parse_created(it)
+        except Exception:
+            dt = None
+        return dt or datetime.min.replace(tzinfo=pytz.UTC)
+
+    ordered = sorted(merged.values(), key=_sort_key, reverse=True)
+    last_offset, (_, last_metadata) = fetched[-1]
+    next_offset = last_offset + limit
+    chunks = [ordered[i : i + limit] for i in range(0, len(ordered), limit)]
+    more = {"pagination": {"has_next": True}}
+    return [
+        (chunk, last_metadata if i == len(chunks) - 1 else more, next_offset)
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def _discard_task(task: asyncio.Task | None) -> None:
+    """Huỷ request đoán trước không còn cần, tránh cảnh báo exception chưa được đọc."""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+async def iter_listing_pages(
+    pg,
+    shop_name: str,
+    shop_id: int,
+    cutoff: datetime,
+    *,
+    limit: int = 100,
+    max_pages: int = 10,
+    prefetch: bool | None = None,
+    fan_out: bool | None = None,
+) -> AsyncIterator[ListingPage]:
+    """
+    Duyệt listings của shop theo created desc, yield từng page ngay khi parse xong
+    để các stage phía sau (lấy ảnh, ghi DB) chạy song song với việc phân trang.
+    Dừng khi vượt qua cutoff hoặc high-water mark của lần chạy trước.
 
+    prefetch (mặc định LISTINGS_PREFETCH): gửi trước request cho page kế tiếp
+    trong lúc page hiện tại đang được xử lý, nếu listing cuối của page vẫn còn mới.
+    Request đoán trước bị huỷ khi page vượt cutoff hoặc has_next=false.
+
+    fan_out (mặc định LISTINGS_FANOUT): khi page đầu cho biết tổng số listing,
+    ước lượng số page cần thêm từ khoảng thời gian page đầu bao phủ rồi tải
+    song song các offset đó. Không có metadata → phân trang tuần tự.
+
+    Raises:
+        IncompleteListingWalk: sau các page đã yield, nếu phân trang dừng vì
+            page lỗi hoặc max_pages (chưa tới cutoff, has_next vẫn true).
+    """
+    if prefetch is None:
+        prefetch = settings.LISTINGS_PREFETCH
+    if fan_out is None:
+        fan_out = settings.LISTINGS_FANOUT
 
-async def fetch_new_listings(pg, shop_name: str, shop_id: int, cutoff: datetime) -> int:
     # Normalize cutoff to UTC-aware
     if cutoff.tzinfo is None or cutoff.utcoffset() is None:
         cutoff = cutoff.replace(tzinfo=pytz.UTC)
 
-    headers = {"x-api-key": API_KEY, "Accept": "application/json"}
-    limit = 100
-    offset = 0
-    new_count = 0
-    table = await ensure_shop_table(pg, shop_id)
+    # High-water mark của lần chạy trước: dừng phân trang khi vượt qua mark
+    mark = await get_shop_watermark(pg, shop_id)
+    boundary = max(cutoff, mark[0]) if mark else cutoff
+    mark_id = mark[1] if mark else None
 
-    max_pages = 10
+    # Session sidcorp dùng chung (đã có x-api-key trong headers mặc định)
+    sess = get_session("sidcorp")
+    offset = 0
     current_page = 0
+    crossed = False
+    next_task: asyncio.Task | None = None
+    fanout_task: asyncio.Task | None = None
+    # Các page đã tải song song, chờ được xử lý: (items, metadata, offset_kế_tiếp)
+    queued: deque = deque()
 
-    # Tính thời gian 24h trước
-    now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-    last24 = now_utc - timedelta(hours=24)
-
-    async with aiohttp.ClientSession(headers=headers) as sess:
-        recent = []
+    def _is_new(item) -> bool:
+        try:
+            dt = _parse_created(item)
+        except Exception:
+            return False
+        return (
+            dt is not None
+            and dt >= boundary
+            and str(item.get("listing_id")) != mark_id
+        )
 
+    try:
         # Pagination với order=desc (mới nhất trước)
         while current_page < max_pages:
-            params = {
-                "shop_id": shop_id,
-                "offset": offset,
-                "limit": limit,
-                "sort_by": "created",
-                "order": "desc",  # Mới nhất trước để tối ưu
-            }
-
-            # Sử dụng retry logic
-            status, data, is_json = await get_with_retries(
-                sess, f"{API_BASE}/listings", params=params
-            )
-
-            logger.info(
-                f"[{shop_name}] GET listings page {current_page + 1}/{max_pages} "
-                f"(offset={offset}) -> {status}"
-            )
-
-            if status != 200:
-                error_msg = data if isinstance(data, str) else str(data)
-                logger.error(f"[{shop_name}] Listing API error {status}: {error_msg}")
-                break
-
-            # Data phải là dict nếu is_json=True
-            if not is_json or not isinstance(data, dict):
-                logger.error(f"[{shop_name}] Invalid response format")
-                break
-
-            # Handle new API format: data is in 'data' field, not 'results'
-            if "data" in data and isinstance(data["data"], list):
-                items = data["data"]  # New format
-                metadata = data.get("metadata", {})
+            if fanout_task is not None:
+                queued.extend(await fanout_task)
+                fanout_task = None
+            next_offset = offset + limit
+            if queued:
+                items, metadata, next_offset = queued.popleft()
+                page = items, metadata
+            elif next_task is not None:
+                page = await next_task
+                next_task = None
             else:
-                items = data.get("results", []) or []  # Old format fallback
-                metadata = data.get("metadata", {})
+                page = await _fetch_listings_page(
+                    sess, shop_name, shop_id, offset, limit
+                )
+            if page is None:
+                raise IncompleteListingWalk(
+                    f"page {current_page + 1} (offset={offset}) failed"
+                )
+            items, metadata = page
+            current_page += 1
 
             if not items:
                 logger.info(f"[{shop_name}] No more items, stopping pagination")
-                break
-
-            # Đếm listings mới và cũ trong page này
-            new_in_page = 0
-            old_in_page = 0
+                return
 
-            for it in items:
-                if not isinstance(it, dict):
-                    continue
+            # Check pagination từ metadata
+            has_more, total = _pagination_info(metadata)
+
+            # Page đầu biết tổng số listing → tải song song các page ước lượng cần
+            if (
+                fan_out
+                and current_page == 1
+                and has_more
+                and total
+                and _is_new(items[-1])
+            ):
+                extra = _estimate_extra_pages(items, boundary)
+                extra = min(extra, -(-total // limit) - 1, max_pages - 1)
+                if extra > 0:
+                    offsets = [next_offset + i * limit for i in range(extra)]
+                    logger.info(
+                        f"[{shop_name}] Fan-out {extra} page(s) (total={total})"
+                    )
+                    fanout_task = asyncio.create_task(
+                        _fan_out_pages(sess, shop_name, shop_id, offsets, limit)
+                    )
 
-                created = it.get("created_at")
-                if not created:
-                    continue
+            # Listing cuối page vẫn mới → chắc chắn cần page sau, gửi request ngay
+            if (
+                prefetch
+                and fanout_task is None
+                and not queued
+                and has_more
+                and current_page < max_pages
+                and _is_new(items[-1])
+            ):
+                # next_offset, không phải offset + limit: sau fan-out mọi chunk
+                # đều mang offset kế tiếp của cả lô
+                next_task = asyncio.create_task(
+                    _fetch_listings_page(sess, shop_name, shop_id, next_offset, limit)
+                )
 
+            recent = []
+            newest = None
+            for it in items:
                 try:
-                    dt = datetime.fromisoformat(created.replace("Z", "+00:00")).replace(
-                        tzinfo=pytz.UTC
-                    )
-
-                    if dt >= last24:
-                        # Listing mới trong 24h
-                        recent.append((str(it.get("listing_id")), it.get("url"), dt))
-                        new_in_page += 1
-                    else:
-                        # Listing cũ hơn 24h
-                        old_in_page += 1
+                    dt = _parse_created(it)
                 except Exception as e:
                     logger.debug(f"[{shop_name}] Parse date error: {e}")
                     continue
+                if dt is None:
+                    continue
+
+                lid = str(it.get("listing_id"))
+                if newest is None or dt > newest[0]:
+                    newest = (dt, lid)
+
+                # Sắp xếp created desc → mọi listing phía sau đều cũ hơn
+                if dt < boundary or lid == mark_id:
+                    crossed = True
+                    break
+
+                # Listing mới trong 24h và mới hơn high-water mark
+                recent.append((lid, it.get("url"), dt))
 
             logger.info(
-                f"[{shop_name}] Page {current_page + 1}: "
-                f"{new_in_page} new, {old_in_page} old listings"
+                f"[{shop_name}] Page {current_page}/{max_pages}: "
+                f"{len(recent)} new listings"
             )
-
-            # Check pagination từ metadata
-            has_more = False
-            if isinstance(metadata, dict):
-                meta = metadata.get("pagination", {})
-                if isinstance(meta, dict):
-                    has_more = meta.get("has_next", metadata.get("has_more", False))
+            yield ListingPage(current_page, recent, newest)
+
+            if crossed:
+                if has_more:
+                    # Số page vòng lặp cũ sẽ phải tải thêm cho tới has_next=false
+                    bound = min(max_pages, -(-total // limit)) if total else max_pages
+                    saved = max(0, bound - current_page)
+                    logger.info(
+                        f"[{shop_name}] Crossed cutoff/high-water mark at page "
+                        f"{current_page}, saved {saved} page(s)"
+                    )
+                return
 
             if not has_more:
                 logger.info(f"[{shop_name}] No more pages available")
-                break
+                return
 
-            offset += limit
-            current_page += 1
+            offset = next_offset
 
-        # Log tổng kết
-        if current_page >= max_pages:
-            logger.info(
-                f"[{shop_name}] Reached max pages limit ({max_pages}), "
-                f"checked {current_page * limit} listings total"
-            )
+        logger.info(
+            f"[{shop_name}] Reached max pages limit ({max_pages}), "
+            f"checked {current_page * limit} listings total"
+        )
+        raise IncompleteListingWalk(f"reached max pages limit ({max_pages})")
+    finally:
+        _discard_task(next_task)
+        _discard_task(fanout_task)
 
-        logger.info(f"[{shop_name}] Total {len(recent)} recent listings found")
 
-        # Insert with image URLs
-        for lid, url_field, dt in recent:
-            # Fetch listing images với retry
-            img_status, img_data, img_is_json = await get_with_retries(
-                sess, f"{API_BASE}/listing-images", params={"listing_ids": lid}
-            )
+async def iter_new_listings(
+    pg, shop_name: str, shop_id: int, cutoff: datetime
+) -> AsyncIterator[tuple[str, str | None, datetime]]:
+    """
+    Như iter_listing_pages nhưng yield từng listing (listing_id, url, created_at).
+    Raises IncompleteListingWalk như iter_listing_pages.
+    """
+    async for page in iter_listing_pages(pg, shop_name, shop_id, cutoff):
+        for listing in page.listings:
+            yield listing
 
-            img_url = ""
-            if img_status == 200 and img_is_json and isinstance(img_data, dict):
-                # Handle new API format for listing-images
-                mapping = {}
-                if "data" in img_data:
-                    data_dict = img_data.get("data")
-                    if isinstance(data_dict, dict) and "listing_images" in data_dict:
-                        listing_imgs = data_dict.get("listing_images")
-                        if isinstance(listing_imgs, dict):
-                            mapping = listing_imgs
-                elif "results" in img_data:
-                    results = img_data.get("results")
-                    if isinstance(results, dict):
-                        listing_imgs = results.get("listing_images")
-                        if isinstance(listing_imgs, dict):
-                            mapping = listing_imgs
-
-                if mapping:
-                    imgs = mapping.get(lid, [])
-                    if imgs and isinstance(imgs, list) and len(imgs) > 0:
-                        first_img = imgs[0]
-                        if isinstance(first_img, dict):
-                            img_url = first_img.get("url_570xN", "")
-            else:
-                logger.warning(f"[{shop_name}] Images API {lid} failed: {img_status}")
 
-            img_str = img_url or ""
+async def fetch_new_listings(
+    pg, shop_name: str, shop_id: int, cutoff: datetime, count_day: date | None = None
+) -> int:
+    """
+    Thu thập listings mới của shop và ghi vào DB.
+    count_day: ngày báo cáo để cộng số listing mới vào daily_shop_counts.
+    """
+    sess = get_session("sidcorp")
+    newest = None  # (created_at, listing_id) mới nhất đã thấy → high-water mark
+    n_recent = 0
+    complete = True
+    pending: list[asyncio.Task] = []
+
+    async def _store_page(listings: list) -> int:
+        # Lấy ảnh theo batch thay vì 1 request/listing, rồi ghi cả page một lần
+        images = await fetch_listing_images(
+            sess, shop_name, [lid for lid, _, _ in listings]
+        )
+        rows = [
+            (shop_id, lid, url_field, images.get(lid, ""), dt)
+            for lid, url_field, dt in listings
+        ]
+        try:
+            return await bulk_upsert_listings(pg, rows, count_day=count_day)
+        except Exception as e:
+            logger.error(f"[{shop_name}] DB bulk insert error: {e}")
+            raise
 
-            try:
-                await pg.execute(
-                    f"INSERT INTO {table} (listing_id, url, listing_images, created_at) VALUES ($1,$2,$3,$4) ON CONFLICT DO NOTHING;",
-                    lid,
-                    url_field,
-                    img_str,
-                    dt,
-                )
-                new_count += 1
-            except Exception as e:
-                logger.debug(f"[{shop_name}] DB insert error: {e}")
+    try:
+        # Mỗi page được lấy ảnh + ghi DB ngay trong lúc tải page tiếp theo
+        try:
+            async for page in iter_listing_pages(pg, shop_name, shop_id, cutoff):
+                if page.newest and (newest is None or page.newest[0] > newest[0]):
+                    newest = page.newest
+                if page.listings:
+                    n_recent += len(page.listings)
+                    pending.append(asyncio.create_task(_store_page(page.listings)))
+        except IncompleteListingWalk as e:
+            # Vẫn ghi các page đã lấy được, nhưng không dời mark qua phần chưa duyệt
+            complete = False
+            logger.warning(f"[{shop_name}] Incomplete listings walk: {e}")
+        counts = await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
+
+    logger.info(f"[{shop_name}] Total {n_recent} recent listings found")
+    new_count = sum(counts)
+
+    # Mark chỉ dời khi đã duyệt tới cutoff/mark (hoặc hết listing) và mọi page
+    # đã được ghi; lần sau sẽ duyệt lại phần còn thiếu
+    if complete and newest is not None:
+        await bulk_upsert_listings(pg, [], [(shop_id, newest[0], newest[1])])
 
     logger.info(f"[{shop_name}] Total new: {new_count}")
     return new_count
 
 
+async def _load_shops(pg) -> list[tuple[str, int]]:
+    """Mọi (shop_name, shop_id) đang được ít nhất một group theo dõi."""
+    return await get_subscribed_shops(pg)
+
+
+def _report_day() -> date:
+    """Ngày báo cáo của lượt thu thập/daily report hiện tại (hôm qua, giờ VN)."""
+    return datetime.now(TZ).date() - timedelta(days=1)
+
+
+def _collection_cutoff() -> datetime:
+    """Mốc 24h trước (UTC) cho lượt thu thập listings."""
+    return (datetime.now(TZ) - timedelta(days=1)).astimezone(pytz.UTC)
+
+
 async def collect_listings():
-    pg = await init_pg_pool()
+    pg = await get_pg_pool()
     await ensure_seen_table(pg)
-    cutoff_local = datetime.now(TZ) - timedelta(days=1)
-    cutoff = cutoff_local.astimezone(pytz.UTC)
-    daily_counts.clear()
-    shops = set()
-    for gid in await get_all_group_ids(pg):
-        for name, sid in await get_shops_for_group(pg, gid):
-            shops.add((name, sid))
-    for name, sid in shops:
-        cnt = await fetch_new_listings(pg, name, sid, cutoff)
-        daily_counts[name] = cnt
+    await init_listings_tables(pg)
+    # Chuyển dữ liệu từ các bảng listing_{shop_id} cũ (nếu còn)
+    await migrate_legacy_listing_tables(pg)
+    cutoff = _collection_cutoff()
+    day = _report_day()
+    shops = await _load_shops(pg)
+
+    async def _collect_one(name: str, sid: int) -> int:
+        # Số listing mới được cộng vào daily_shop_counts ngay khi ghi từng page
+        return await fetch_new_listings(pg, name, sid, cutoff, count_day=day)
+
+    # Worker pool giới hạn song song, thời gian tổng tỉ lệ với concurrency
+    summary = await run_collection(shops, _collect_one)
+
+    # Shop bị bỏ qua vì upstream down → thử lại sau khi circuit half-open
+    for round_no in range(1, settings.COLLECT_RETRY_ROUNDS + 1):
+        if not summary.unavailable:
+            break
+        wait = settings.CIRCUIT_RESET_TIMEOUT
+        logger.warning(
+            f"[COLLECT] Retry round {round_no}/{settings.COLLECT_RETRY_ROUNDS}: "
+            f"{len(summary.unavailable)} shops in {wait:.0f}s"
+        )
+        await asyncio.sleep(wait)
+        summary = await run_collection(sorted(summary.unavailable.items()), _collect_one)
 
 
 async def send_daily_summary():
-    pg = await init_pg_pool()
-    label = (datetime.now(TZ).date() - timedelta(days=1)).isoformat()
-    for gid in await get_all_group_ids(pg):
-        lines = []
-        for name, sid in await get_shops_for_group(pg, gid):
-            cnt = daily_counts.get(name, 0)
-            link = f"https://dakuho.com/topics/{gid}/shops/{sid}"
-            lines.append(f"• {name}: {cnt} new [Xem thêm]({link})")
-        text = f"📊 *Daily Report {label}*\n\n" + (
-            "\n".join(lines) if lines else "No subscriptions."
-        )
-        await send_message(gid, text)
+    pg = await get_pg_pool()
+    await init_outbox_table(pg)
+    # Dựng report cho mọi group từ 1 query (đọc daily_shop_counts trong DB:
+    # đúng cả khi poller restart hoặc thu thập chạy ở process khác), rồi mới gửi
+    day = _report_day()
+    reports = await build_daily_reports(pg, day)
+    # Ghi cả lô vào outbox trong một transaction; chạy lại không gửi trùng
+    await enqueue_notifications(pg, "daily_report", day.isoformat(), reports)
+    logger.info(f"[REPORT] Queued {len(reports)} daily reports for delivery")
 
 
 def _escape_telegram_markdown(text: str) -> str:
@@ -363,191 +788,466 @@ def _format_fb_post(post: dict, page_name: str) -> str:
     return "\n".join(lines)
 
 
+def _group_fb_subscriptions(all_subs) -> dict[str, dict]:
+    """Gom subscription theo page_id: page_id → {page_name, chat_ids}."""
+    pages: dict[str, dict] = {}
+    for chat_id, page_id, page_name in all_subs:
+        if page_id not in pages:
+            pages[page_id] = {"page_name": page_name, "chat_ids": []}
+        pages[page_id]["chat_ids"].append(chat_id)
+    return pages
+
+
+def _parse_fb_post(post: dict) -> dict | None:
+    """Chuẩn hoá một bài đăng tool.vn; None nếu thiếu post_id hoặc thời gian đăng."""
+    post_id = str(
+        post.get("strong_id__") or post.get("post_id") or post.get("id") or ""
+    )
+    if not post_id:
+        return None
+
+    # ── Thời gian đăng ──────────────────────────────────────────────────
+    ts = post.get("creation_time")
+    created_at = None
+    if ts:
+        try:
+            created_at = datetime.fromtimestamp(int(ts), tz=pytz.UTC)
+        except Exception:
+            pass
+    # Không có timestamp thì không so được với cursor → bỏ qua
+    if created_at is None:
+        return None
+
+    # ── Nội dung văn bản ─────────────────────────────────────────────────
+    msg_field = post.get("message")
+    message = (
+        msg_field.get("text", "") if isinstance(msg_field, dict) else (msg_field or "")
+    )
+
+    # ── Ảnh đầu tiên từ attachments ──────────────────────────────────────
+    image_url = ""
+    for att in post.get("attachments") or []:
+        if not isinstance(att, dict):
+            continue
+        media = att.get("media") or {}
+        img = media.get("image") or {}
+        uri = img.get("uri", "")
+        if uri:
+            image_url = uri
+            break
+
+    # ── URL bài viết ─────────────────────────────────────────────────────
+    post_url = post.get("url") or post.get("permalink_url") or ""
+
+    # ── Tương tác ────────────────────────────────────────────────────────
+    feedback = post.get("feedback") or {}
+    reaction_count = int(feedback.get("reaction_count") or 0)
+    comment_count_obj = feedback.get("comment_count") or {}
+    comment_count = int(
+        comment_count_obj.get("total_count") or 0
+        if isinstance(comment_count_obj, dict)
+        else comment_count_obj or 0
+    )
+
+    return {
+        "post_id": post_id,
+        "created_at": created_at,
+        "message": message,
+        "image_url": image_url,
+        "post_url": post_url,
+        "reaction_count": reaction_count,
+        "comment_count": comment_count,
+    }
+
+
+def _fb_fetch_cost(limit: int) -> int:
+    """Credits tool.vn ước tính cho một lần gọi với `limit`."""
+    return max(settings.FB_CREDITS_PER_POLL, limit * settings.FB_CREDITS_PER_POST)
+
+
+def _is_after_cursor(
+    post: dict, cursor: tuple[str, datetime] | None, since: datetime
+) -> bool:
+    """Bài mới hơn cursor của page; page chưa có cursor → bài đăng từ `since`."""
+    if cursor is None:
+        return post["created_at"] >= since
+    post_id, created_at = cursor
+    return post["post_id"] != post_id and post["created_at"] >= created_at
+
+
+async def fetch_new_fb_posts(
+    page_id: str,
+    cursor: tuple[str, datetime] | None,
+    now_utc: datetime,
+    session: aiohttp.ClientSession | None = None,
+) -> tuple[list[dict], int, tuple[str, datetime] | None]:
+    """
+    Lấy các bài mới hơn cursor của page với ít credits nhất.
+
+    Gọi với limit nhỏ nhất trong FB_FETCH_LIMITS; chỉ khi MỌI bài trả về đều
+    mới hơn cursor (có thể còn bài mới chưa lấy) mới gọi lại với mức kế tiếp,
+    tối đa 20. Gặp bài đã thấy hoặc page trả ít hơn limit → đã đủ.
+
+    Returns:
+        (các bài mới đã chuẩn hoá, credits đã dùng, (post_id, created_at) của
+        bài mới nhất đã fetch — kể cả khi không có bài nào mới)
+    """
+    since = now_utc - FB_INITIAL_WINDOW
+    credits = 0
+    new: list[dict] = []
+    newest: tuple[str, datetime] | None = None
+    for limit in settings.FB_FETCH_LIMITS:
+        raw = await fetch_fb_posts(page_id, limit=limit, session=session)
+        credits += _fb_fetch_cost(limit)
+        parsed = [p for p in map(_parse_fb_post, raw) if p is not None]
+        if parsed:
+            top = max(parsed, key=lambda p: p["created_at"])
+            newest = (top["post_id"], top["created_at"])
+        new = [p for p in parsed if _is_after_cursor(p, cursor, since)]
+        if len(new) < len(parsed) or len(raw) < limit:
+            break
+        if limit < settings.FB_FETCH_LIMITS[-1]:
+            logger.debug(
+                f"[FB] Page {page_id}: all {len(raw)} posts are new, "
+                f"escalating limit"
+            )
+    else:
+        logger.warning(
+            f"[FB] Page {page_id}: all {len(new)} posts at the max limit are new, "
+            f"older new posts may have been missed"
+        )
+    return new, credits, newest
+
+
+async def _store_fb_posts(
+    pg,
+    page_id: str,
+    page_name: str,
+    chat_ids: list[int],
+    posts: list[dict],
+    newest: tuple[str, datetime] | None = None,
+) -> int:
+    """
+    Lưu các bài mới (đã chuẩn hoá) của một page vào fb_posts và đẩy cursor của
+    page. Thông báo cho các group được ghi vào notification_outbox cùng
+    transaction với bài mới, theo thứ tự thời gian đăng.
+
+    Không có bài mới → cursor vẫn được đẩy tới `newest` (bài mới nhất đã fetch),
+    để page chưa có cursor không chỉ dựa vào cửa sổ FB_INITIAL_WINDOW ở các lần
+    poll sau (interval có thể dài hơn nhiều so với 6h).
+
+    Returns:
+        Số bài mới đã lưu.
+    """
+    # Sắp theo thời gian tăng dần để nhóm nhận theo thứ tự bài đăng
+    parsed = sorted(posts, key=lambda x: x["created_at"])
+    rows = [
+        (
+            page_id,
+            p["post_id"],
+            page_name,
+            p["created_at"],
+            p["message"],
+            p["image_url"],
+            p["post_url"],
+            p["reaction_count"],
+            p["comment_count"],
+        )
+        for p in parsed
+    ]
+    notifications = {
+        (page_id, p["post_id"]): [
+            (chat_id, _format_fb_post(p, page_name)) for chat_id in chat_ids
+        ]
+        for p in parsed
+    }
+    if not rows:
+        if newest is not None:
+            await advance_fb_page_cursor(pg, page_id, *newest)
+        return 0
+    # Cả page trong 1 round trip, biết ngay bài nào là bài mới
+    new = await bulk_save_fb_posts(pg, rows, notifications)
+    n_new = len(new)
+
+    if n_new:
+        logger.info(f"[FB] Page '{page_name}': {n_new} bài mới đã lưu vào fb_posts.")
+    return n_new
+
+
+async def _due_fb_pages(pg, page_ids: list[str], now_utc: datetime) -> list[str]:
+    """
+    Các page cần poll lần này: page tới hạn theo lịch adaptive, hoặc mọi page
+    khi tắt FB_ADAPTIVE_POLLING.
+    """
+    if settings.FB_ADAPTIVE_POLLING:
+        return await claim_due_fb_pages(pg, page_ids, now_utc)
+    return page_ids
+
+
 async def poll_fb_pages():
-    """Quét bài đăng mới từ các Facebook fanpage trong 6 giờ gần nhất."""
-    logger.info("[FB] Bắt đầu poll Facebook pages...")
-    pg = await init_pg_pool()
+    """Quét bài đăng mới từ các Facebook fanpage đã tới hạn poll."""
+    pg = await get_pg_pool()
     await init_fb_tables(pg)
+    await init_outbox_table(pg)
 
     all_subs = await get_all_fb_page_subscriptions(pg)
     if not all_subs:
         logger.info("[FB] Chưa có subscription nào.")
         return
 
-    # Lấy bài đăng trong 6 giờ gần nhất (UTC)
-    now_utc = datetime.now(pytz.UTC)
-    window_start_utc = now_utc - timedelta(hours=6)
-    logger.info(
-        f"[FB] Chỉ lấy bài đăng từ {window_start_utc.isoformat()} đến {now_utc.isoformat()}"
-    )
-
     # Gom theo page_id để mỗi page chỉ fetch 1 lần
-    pages: dict[str, dict] = {}
-    for chat_id, page_id, page_name in all_subs:
-        if page_id not in pages:
-            pages[page_id] = {"page_name": page_name, "chat_ids": []}
-        pages[page_id]["chat_ids"].append(chat_id)
+    pages = _group_fb_subscriptions(all_subs)
+    now_utc = datetime.now(pytz.UTC)
+    due = await _due_fb_pages(pg, list(pages), now_utc)
+    if not due:
+        logger.debug(f"[FB] Chưa có page nào tới hạn poll ({len(pages)} pages).")
+        return
+    cursors = await get_fb_page_cursors(pg, due)
 
-    # limit=3 → chi phí tối thiểu 30 credits/page/lần gọi
-    # 6h/lần, hầu hết page đăng ≤3 bài trong 6h
-    FB_FETCH_LIMIT = 3
     MAX_CONCURRENT = 3  # Chạy tối đa 3 page song song
-    total_pages = len(pages)
-    estimated_credits = total_pages * 30
+    total_pages = len(due)
     logger.info(
-        f"[FB] Quét {total_pages} pages, limit={FB_FETCH_LIMIT}/page, "
-        f"concurrency={MAX_CONCURRENT}, "
-        f"ước tính ~{estimated_credits} credits cho lần quét này"
+        f"[FB] Quét {total_pages}/{len(pages)} pages tới hạn, "
+        f"limit={'→'.join(map(str, settings.FB_FETCH_LIMITS))}/page, "
+        f"concurrency={MAX_CONCURRENT}, ước tính tối thiểu "
+        f"~{total_pages * _fb_fetch_cost(settings.FB_FETCH_LIMITS[0])} credits"
     )
 
     sem = asyncio.Semaphore(MAX_CONCURRENT)
-    results: dict[str, list] = {}  # page_id → posts
 
-    async def _fetch_one(pid: str, pname: str, sess: aiohttp.ClientSession):
+    async def _fetch_one(
+        pid: str, pname: str, sess: aiohttp.ClientSession
+    ) -> tuple[str, list | None, int, tuple[str, datetime] | None]:
         async with sem:
             try:
-                posts = await fetch_fb_posts(pid, limit=FB_FETCH_LIMIT, session=sess)
-                results[pid] = posts
+                posts, credits, newest = await fetch_new_fb_posts(
+                    pid, cursors.get(pid), now_utc, session=sess
+                )
                 logger.info(
-                    f"[FB] Page '{pname}' ({pid}): {len(posts)} posts fetched"
+                    f"[FB] Page '{pname}' ({pid}): {len(posts)} new posts "
+                    f"(~{credits} credits)"
                 )
+                return pid, posts, credits, newest
             except Exception as e:
-                results[pid] = []
                 logger.error(f"[FB] Lỗi khi fetch page '{pname}' ({pid}): {e}")
+                return pid, None, 0, None
 
-    # Dùng chung 1 session cho tất cả requests (tái sử dụng TCP connections)
-    async with create_toolvn_session() as shared_session:
-        tasks = [
-            _fetch_one(page_id, info["page_name"], shared_session)
-            for page_id, info in pages.items()
-        ]
-        await asyncio.gather(*tasks)
+    # Dùng chung session tool.vn của process (tái sử dụng TCP connections)
+    shared_session = get_session("toolvn")
+    tasks = [
+        asyncio.create_task(
+            _fetch_one(page_id, pages[page_id]["page_name"], shared_session)
+        )
+        for page_id in due
+    ]
+
+    # Xử lý từng page ngay khi fetch xong (không chờ page chậm nhất):
+    # lưu DB, thông báo vào outbox và đánh thức delivery worker
+    total_new = 0
+    total_credits = 0
+    retry_at = now_utc + timedelta(seconds=settings.FB_POLL_MIN_INTERVAL)
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            page_id, posts, credits, newest = await next_done
+            total_credits += credits
+            info = pages[page_id]
+            if posts is None:
+                await mark_fb_page_polled(pg, page_id, now_utc, retry_at=retry_at)
+                continue
+            try:
+                n_new = await _store_fb_posts(
+                    pg, page_id, info["page_name"], info["chat_ids"], posts, newest
+                )
+                await mark_fb_page_polled(pg, page_id, now_utc)
+            except Exception as e:
+                logger.error(
+                    f"[FB] Lỗi khi lưu page '{info['page_name']}' ({page_id}): {e}"
+                )
+                continue
+            total_new += n_new
+            if n_new:
+                wake_outbox_worker()
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    # Xử lý kết quả, lưu DB và gom notification theo group
-    messages_by_chat: dict[int, list[tuple[datetime, str]]] = {}
+    logger.info(
+        f"[FB] Hoàn thành thu thập Facebook. "
+        f"Đã quét {total_pages} pages, tiêu tốn ~{total_credits} credits, "
+        f"{total_new} bài mới đã đưa vào hàng đợi thông báo."
+    )
 
-    for page_id, info in pages.items():
-        page_name = info["page_name"]
-        chat_ids = info["chat_ids"]
-        posts = results.get(page_id, [])
-        new_posts_for_page: list[dict] = []
 
-        for post in posts:
-            post_id = str(
-                post.get("strong_id__") or post.get("post_id") or post.get("id") or ""
-            )
-            if not post_id:
-                continue
+# ── Chế độ phân tán: coordinator đẩy task, worker thu thập ──────────────────
+def _work_queue() -> WorkQueue:
+    return WorkQueue(
+        "poller",
+        lease=settings.WORK_LEASE_SECONDS,
+        max_attempts=settings.WORK_MAX_ATTEMPTS,
+    )
 
-            # ── Thời gian đăng ──────────────────────────────────────────────
-            ts = post.get("creation_time")
-            created_at = None
-            if ts:
-                try:
-                    created_at = datetime.fromtimestamp(int(ts), tz=pytz.UTC)
-                except Exception:
-                    pass
 
-            # Chỉ lưu bài đăng trong 6 giờ gần nhất; bỏ qua nếu không có timestamp
-            if created_at is None:
-                continue
-            if not (window_start_utc <= created_at <= now_utc):
-                continue
+async def enqueue_listing_tasks():
+    """Coordinator: đẩy một task thu thập listings cho mỗi shop vào Redis."""
+    pg = await get_pg_pool()
+    await ensure_seen_table(pg)
+    await init_listings_tables(pg)
+    await migrate_legacy_listing_tables(pg)
+    cutoff = _collection_cutoff().isoformat()
+    day = _report_day().isoformat()
+    shops = await _load_shops(pg)
 
-            # ── Nội dung văn bản ─────────────────────────────────────────────
-            msg_field = post.get("message")
-            message = (
-                msg_field.get("text", "")
-                if isinstance(msg_field, dict)
-                else (msg_field or "")
-            )
+    queue = _work_queue()
+    for name, sid in shops:
+        await queue.enqueue(
+            "listings",
+            {"shop_name": name, "shop_id": sid, "cutoff": cutoff, "day": day},
+        )
+    logger.info(f"[COORD] Enqueued {len(shops)} listing tasks, {await queue.stats()}")
 
-            # ── Ảnh đầu tiên từ attachments ──────────────────────────────────
-            image_url = ""
-            for att in post.get("attachments") or []:
-                if not isinstance(att, dict):
-                    continue
-                media = att.get("media") or {}
-                img = media.get("image") or {}
-                uri = img.get("uri", "")
-                if uri:
-                    image_url = uri
-                    break
 
-            # ── URL bài viết ─────────────────────────────────────────────────
-            post_url = post.get("url") or post.get("permalink_url") or ""
-
-            # ── Tương tác ────────────────────────────────────────────────────
-            feedback = post.get("feedback") or {}
-            reaction_count = int(feedback.get("reaction_count") or 0)
-            comment_count_obj = feedback.get("comment_count") or {}
-            comment_count = int(
-                comment_count_obj.get("total_count") or 0
-                if isinstance(comment_count_obj, dict)
-                else comment_count_obj or 0
-            )
+async def enqueue_fb_tasks():
+    """Coordinator: đẩy một task cho mỗi Facebook page đã tới hạn poll."""
+    pg = await get_pg_pool()
+    await init_fb_tables(pg)
+    pages = _group_fb_subscriptions(await get_all_fb_page_subscriptions(pg))
 
-            is_new = await save_fb_post(
-                pg,
-                page_id,
-                post_id,
-                page_name,
-                created_at,
-                message,
-                image_url,
-                post_url,
-                reaction_count,
-                comment_count,
-            )
-            if is_new:
-                new_posts_for_page.append(
-                    {
-                        "created_at": created_at,
-                        "message": message,
-                        "post_url": post_url,
-                    }
-                )
+    now_utc = datetime.now(pytz.UTC)
+    due = await _due_fb_pages(pg, list(pages), now_utc)
+    if not due:
+        return
+    queue = _work_queue()
+    for page_id in due:
+        info = pages[page_id]
+        await queue.enqueue(
+            "fb_page",
+            {
+                "page_id": page_id,
+                "page_name": info["page_name"],
+                "chat_ids": info["chat_ids"],
+                "now": now_utc.isoformat(),
+            },
+        )
+    logger.info(
+        f"[COORD] Enqueued {len(due)}/{len(pages)} FB page tasks, "
+        f"{await queue.stats()}"
+    )
 
-        if new_posts_for_page:
-            logger.info(
-                f"[FB] Page '{page_name}': {len(new_posts_for_page)} bài mới đã lưu vào fb_posts."
-            )
 
-            # Sắp theo thời gian tăng dần để nhóm nhận theo thứ tự bài đăng
-            new_posts_for_page.sort(key=lambda x: x.get("created_at") or now_utc)
-            for post_data in new_posts_for_page:
-                msg = _format_fb_post(post_data, page_name)
-                created_at = post_data.get("created_at") or now_utc
-                for chat_id in chat_ids:
-                    messages_by_chat.setdefault(chat_id, []).append((created_at, msg))
-
-    # Gửi thông báo Telegram cho từng nhóm
-    total_sent = 0
-    for chat_id, items in messages_by_chat.items():
-        items.sort(key=lambda x: x[0])
-        for _, text in items:
-            try:
-                await send_message(chat_id, text)
-                total_sent += 1
-            except Exception as e:
-                logger.error(f"[FB] Gửi Telegram lỗi cho chat_id={chat_id}: {e}")
+async def requeue_expired_tasks():
+    """Coordinator: giao lại task của worker đã chết (hết lease)."""
+    queue = _work_queue()
+    requeued = await queue.requeue_expired()
+    if requeued:
+        logger.warning(f"[COORD] Re-delivered {requeued} expired tasks")
 
-    logger.info(
-        f"[FB] Hoàn thành thu thập Facebook. "
-        f"Đã quét {total_pages} pages, tiêu tốn ~{estimated_credits} credits, "
-        f"đã gửi {total_sent} thông báo Telegram."
+
+async def serve_worker(stop: asyncio.Event):
+    """Worker: nhận task từ Redis cho tới khi `stop` được set."""
+    pg = await get_pg_pool()
+    await init_listings_tables(pg)
+    await init_fb_tables(pg)
+    await init_outbox_table(pg)
+
+    async def _listings(task: Task) -> None:
+        p = task.payload
+        cutoff = datetime.fromisoformat(p["cutoff"])
+        await asyncio.wait_for(
+            fetch_new_listings(
+                pg,
+                p["shop_name"],
+                p["shop_id"],
+                cutoff,
+                count_day=date.fromisoformat(p["day"]),
+            ),
+            timeout=settings.COLLECT_SHOP_TIMEOUT,
+        )
+
+    async def _fb_page(task: Task) -> None:
+        p = task.payload
+        polled_at = datetime.fromisoformat(p["now"])
+        # Đọc cursor lúc chạy (không gửi kèm task) để task giao lại vẫn đúng
+        cursors = await get_fb_page_cursors(pg, [p["page_id"]])
+        posts, _, newest = await fetch_new_fb_posts(
+            p["page_id"],
+            cursors.get(p["page_id"]),
+            polled_at,
+            session=get_session("toolvn"),
+        )
+        n_new = await _store_fb_posts(
+            pg, p["page_id"], p["page_name"], p["chat_ids"], posts, newest
+        )
+        await mark_fb_page_polled(pg, p["page_id"], polled_at)
+        if n_new:
+            wake_outbox_worker()
+
+    await run_worker(
+        _work_queue(),
+        {"listings": _listings, "fb_page": _fb_page},
+        concurrency=settings.WORKER_CONCURRENCY,
+        stop=stop,
     )
 
 
+async def serve_delivery(stop: asyncio.Event):
+    """Delivery worker: gửi thông báo từ notification_outbox."""
+    pg = await get_pg_pool()
+    await run_outbox_worker(pg, stop)
+
+
 def main():
     loop = asyncio.get_event_loop()
+    mode = settings.POLLER_MODE
+    logger.info(f"[POLLER] Starting in {mode} mode")
+    stop = asyncio.Event()
+
+    if mode in ("worker", "delivery"):
+        # docker stop → ngừng nhận việc mới; task / thông báo bị kill giữa
+        # chừng (chưa ack) sẽ được giao lại khi hết lease
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        jobs = [serve_delivery(stop)]
+        if mode == "worker":
+            jobs.append(serve_worker(stop))
+        try:
+            loop.run_until_complete(asyncio.gather(*jobs))
+        finally:
+            loop.run_until_complete(close_sessions())
+            loop.run_until_complete(close_pg_pool())
+        return
+
+    # Tạo pool trước khi lập lịch: mọi job dùng chung một pool
+    loop.run_until_complete(get_pg_pool())
     sched = AsyncIOScheduler(event_loop=loop, timezone="Asia/Bangkok")
-    sched.add_job(collect_listings, "cron", hour=5, minute=0)
-    # Chạy quét fanpage mỗi 6 tiếng: 00:00, 06:00, 12:00, 18:00
-    sched.add_job(poll_fb_pages, "cron", hour="*/6", minute=0)
+    if mode == "coordinator":
+        sched.add_job(enqueue_listing_tasks, "cron", hour=5, minute=0)
+        fb_job = enqueue_fb_tasks
+        sched.add_job(requeue_expired_tasks, "interval", seconds=30)
+    else:
+        sched.add_job(collect_listings, "cron", hour=5, minute=0)
+        fb_job = poll_fb_pages
+    if settings.FB_ADAPTIVE_POLLING:
+        # Kiểm tra định kỳ, mỗi page được poll theo lịch riêng
+        sched.add_job(fb_job, "interval", minutes=settings.FB_POLL_TICK_MINUTES)
+    else:
+        # Chạy quét fanpage mỗi 6 tiếng: 00:00, 06:00, 12:00, 18:00
+        sched.add_job(fb_job, "cron", hour="*/6", minute=0)
     sched.add_job(send_daily_summary, "cron", hour=6, minute=0)
     sched.start()
-    loop.run_forever()
+    # Standalone: gửi thông báo ngay trong process
+    delivery = None
+    if mode != "coordinator":
+        delivery = loop.create_task(serve_delivery(stop))
+    # docker stop gửi SIGTERM → dừng loop để đóng các HTTP session dùng chung
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    try:
+        loop.run_forever()
+    finally:
+        sched.shutdown(wait=False)
+        if delivery is not None:
+            delivery.cancel()
+            loop.run_until_complete(asyncio.gather(delivery, return_exceptions=True))
+        loop.run_until_complete(close_sessions())
+        loop.run_until_complete(close_pg_pool())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from api.circuit_breaker import UpstreamUnavailable
+from db.redis_client import redis
+
+logger = logging.getLogger(__name__)
+
+# Lấy 1 task khỏi pending và cấp lease trong cùng một lệnh (atomic):
+# worker crash giữa 2 bước không làm mất task.
+# KEYS: pending, leases, tasks, attempts   ARGV: deadline
+_CLAIM_LUA = """
+local task_id = redis.call('RPOP', KEYS[1])
+if not task_id then return nil end
+redis.call('ZADD', KEYS[2], ARGV[1], task_id)
+local attempts = redis.call('HINCRBY', KEYS[4], task_id, 1)
+-- false (không phải nil) để không cắt cụt mảng trả về
+return {task_id, redis.call('HGET', KEYS[3], task_id) or false, attempts}
+"""
+
+# Đưa các task hết lease về lại pending (ưu tiên giao trước),
+# task đã giao quá max_attempts lần chuyển sang dead: payload được chuyển hẳn
+# vào list dead (giữ DEAD_KEEP bản ghi mới nhất) thay vì nằm mãi trong tasks.
+# KEYS: pending, leases, attempts, dead, tasks   ARGV: now, max_attempts, dead_keep
+_REQUEUE_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+local requeued = 0
+for _, task_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], task_id)
+    local attempts = tonumber(redis.call('HGET', KEYS[3], task_id) or '0')
+    if attempts >= tonumber(ARGV[2]) then
+        local body = redis.call('HGET', KEYS[5], task_id) or ''
+        redis.call('LPUSH', KEYS[4], cjson.encode(
+            {id = task_id, attempts = attempts, task = body, at = tonumber(ARGV[1])}
+        ))
+        redis.call('LTRIM', KEYS[4], 0, tonumber(ARGV[3]) - 1)
+        redis.call('HDEL', KEYS[5], task_id)
+        redis.call('HDEL', KEYS[3], task_id)
+    else
+        redis.call('RPUSH', KEYS[1], task_id)
+        requeued = requeued + 1
+    end
+end
+return requeued
+"""
+
+# Gia hạn lease, chỉ khi task vẫn đang được giữ (chưa bị requeue cho worker khác)
+# KEYS: leases   ARGV: deadline, task_id
+_EXTEND_LUA = """
+if redis.call('ZSCORE', KEYS[1], ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+# Số task dead mới nhất được giữ lại để xem lỗi
+DEAD_KEEP = 1000
+
+
+@dataclass
+class Task:
+    """Một task đã được worker claim."""
+
+    id: str
+    kind: str
+    payload: dict
+    attempts: int
+
+
+TaskHandler = Callable[[Task], Awaitable[None]]
+
+
+class WorkQueue:
+    """
+    Hàng đợi task trên Redis cho chế độ phân tán (coordinator / worker).
+
+    - pending (list): task chờ giao.
+    - leases (sorted set): task đang chạy, score = hạn lease. Worker giữ lease
+      bằng heartbeat; hết hạn mà chưa ack (worker crash) → task được giao lại.
+    - tasks (hash): task_id → JSON {kind, payload}.
+    - attempts (hash): số lần task đã được giao; quá max_attempts → dead.
+      Task bị hoãn vì circuit mở (retry_later) không tính là một lần thử.
+    - dead (list): JSON {id, attempts, task, at} của task đã bỏ, tối đa DEAD_KEEP.
+    """
+
+    def __init__(self, name: str, lease: float, max_attempts: int):
+        self.name = name
+        self.lease = lease
+        self.max_attempts = max_attempts
+        prefix = f"work:{name}"
+        self.pending_key = f"{prefix}:pending"
+        self.leases_key = f"{prefix}:leases"
+        self.tasks_key = f"{prefix}:tasks"
+        self.attempts_key = f"{prefix}:attempts"
+        self.dead_key = f"{prefix}:dead"
+        self._claim = redis.register_script(_CLAIM_LUA)
+        self._requeue = redis.register_script(_REQUEUE_LUA)
+        self._extend = redis.register_script(_EXTEND_LUA)
+
+    async def enqueue(self, kind: str, payload: dict) -> str:
+        task_id = uuid.uuid4().hex
+        body = json.dumps({"kind": kind, "payload": payload})
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.tasks_key, task_id, body)
+            pipe.lpush(self.pending_key, task_id)
+            await pipe.execute()
+        return task_id
+
+    async def claim(self) -> Optional[Task]:
+        """Lấy task kế tiếp (FIFO) kèm lease, None nếu hàng đợi rỗng."""
+        res = await self._claim(
+            keys=[self.pending_key, self.leases_key, self.tasks_key, self.attempts_key],
+            args=[time.time() + self.lease],
+        )
+        if not res:
+            return None
+        task_id, body, attempts = res
+        if body is None:
+            # Task đã bị xoá (vd: ack trễ) → bỏ qua
+            await self._forget(task_id)
+            return None
+        data = json.loads(body)
+        return Task(task_id, data["kind"], data["payload"], int(attempts))
+
+    async def extend(self, task_id: str) -> bool:
+        """Gia hạn lease; False nếu task đã bị thu hồi."""
+        return bool(
+            await self._extend(
+                keys=[self.leases_key], args=[time.time() + self.lease, task_id]
+            )
+        )
+
+    async def ack(self, task_id: str) -> None:
+        await self._forget(task_id)
+
+    async def retry_later(self, task_id: str, delay: float) -> None:
+        """
+        Trả task về hàng đợi sau `delay` giây (dời hạn lease, để requeue giao lại).
+        Lần giao này không tính vào max_attempts: upstream down kéo dài không
+        được đẩy task sang dead.
+        """
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.leases_key, {task_id: time.time() + delay})
+            pipe.hincrby(self.attempts_key, task_id, -1)
+            await pipe.execute()
+
+    async def requeue_expired(self) -> int:
+        """Giao lại task hết lease. Returns: số task được đưa về pending."""
+        return int(
+            await self._requeue(
+                keys=[
+                    self.pending_key,
+                    self.leases_key,
+                    self.attempts_key,
+                    self.dead_key,
+                    self.tasks_key,
+                ],
+                args=[time.time(), self.max_attempts, DEAD_KEEP],
+            )
+        )
+
+    async def stats(self) -> Dict[str, int]:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.pending_key)
+            pipe.zcard(self.leases_key)
+            pipe.llen(self.dead_key)
+            pending, leased, dead = await pipe.execute()
+        return {"pending": pending, "leased": leased, "dead": dead}
+
+    async def _forget(self, task_id: str) -> None:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.leases_key, task_id)
+            pipe.hdel(self.tasks_key, task_id)
+            pipe.hdel(self.attempts_key, task_id)
+            await pipe.execute()
+
+
+async def run_worker(
+    queue: WorkQueue,
+    handlers: Dict[str, TaskHandler],
+    *,
+    concurrency: int,
+    stop: asyncio.Event,
+    idle_wait: float = 1.0,
+) -> None:
+    """
+    Chạy `concurrency` vòng claim → handler → ack cho tới khi `stop` được set.
+
+    Handler raise exception → task không được ack và sẽ được giao lại khi
+    hết lease; UpstreamUnavailable → giao lại khi circuit hết thời gian mở.
+    Trong lúc handler chạy, lease được gia hạn định kỳ.
+    """
+
+    async def _heartbeat(task: Task) -> None:
+        while True:
+            await asyncio.sleep(queue.lease / 3)
+            if not await queue.extend(task.id):
+                logger.warning(f"[WORKER] Lease lost for task {task.kind} {task.id}")
+                return
+
+    async def _loop(n: int) -> None:
+        while not stop.is_set():
+            try:
+                await queue.requeue_expired()
+                task = await queue.claim()
+            except Exception as e:
+                logger.error(f"[WORKER] Queue error: {e}")
+                task = None
+            if task is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=idle_wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            handler = handlers.get(task.kind)
+            if handler is None:
+                logger.error(f"[WORKER] Unknown task kind '{task.kind}', dropping")
+                await queue.ack(task.id)
+                continue
+
+            heartbeat = asyncio.create_task(_heartbeat(task))
+            try:
+                await handler(task)
+            except UpstreamUnavailable as e:
+                # Circuit mở: giao lại sau khi circuit half-open
+                heartbeat.cancel()
+                logger.warning(f"[WORKER-{n}] Task {task.kind} {task.id} deferred: {e}")
+                await queue.retry_later(task.id, max(e.retry_in, 1.0))
+                continue
+            except Exception as e:
+                # Không ack: task được giao lại khi lease hết hạn
+                logger.error(
+                    f"[WORKER-{n}] Task {task.kind} {task.id} failed "
+                    f"(attempt {task.attempts}/{queue.max_attempts}): {e}"
+                )
+                continue
+            finally:
+                heartbeat.cancel()
+            await queue.ack(task.id)
+
+    logger.info(
+        f"[WORKER] Serving queue '{queue.name}' with {concurrency} workers "
+        f"(lease={queue.lease:.0f}s)"
+    )
+    await asyncio.gather(*(_loop(n) for n in range(1, concurrency + 1)))
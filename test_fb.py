@@ -19,6 +19,7 @@ from db.postgres import (
     init_fb_tables,
     subscribe_fb_group,
 )
+from api.http_client import close_sessions
 from poller.poller import poll_fb_pages
 
 logging.basicConfig(
@@ -150,6 +151,7 @@ async def main():
     await step3_subscribe(pg)
     await step4_poll_and_verify(pg)
     await step6_dedup_check(pg)
+    await close_sessions()
 
     sep("KẾT QUẢ")
     print("✅ Test hoàn thành.")